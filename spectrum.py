@@ -18,46 +18,38 @@
 
 # define plugin
 
-from collections import namedtuple
+import time
+
+_import_start = time.perf_counter()
 
 from gi.repository import Gtk
-from gi.repository import Gst
 from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import Peas
-from gi.repository import Gdk
 from gi.repository import RB
 from gi.repository import Gio
-import cairo
 
 from spectrum_rb3compat import ActionGroup
 from spectrum_rb3compat import ApplicationShell
 from spectrum_prefs import Preferences
 from spectrum_prefs import GSetting
 
-
-Rect = namedtuple('Rectangle', 'x y width height')
-
-# LINEAR_COLORS = [
-#                 (1.0, 0.9176470588235294, 0.5764705882352941),
-#                 (1.0, 0.8392156862745098, 0.19215686274509805)]
-
-LINEAR_COLORS = [
-    (0.75, 0.0, 0.0),
-    (0.0, 0.0, 0.5)]
-
-LINEAR_POS = [0.3, 0.8]
-
 view_menu_ui = """
 <ui>
     <menubar name="MenuBar">
         <menu name="ViewMenu" action="View">
             <menuitem name="Spectrum" action="ToggleSpectrum" />
+            <menuitem name="SpectrumWindow" action="DetachSpectrum" />
+            <menuitem name="SpectrumSimilar" action="QueueSimilarSpectrum" />
         </menu>
     </menubar>
 </ui>
 """
 
+# milliseconds playback has to stay stopped before the spectrum is hidden -
+# longer than the gap while the player moves to the next track
+HIDE_DELAY = 2000
+
 
 class SpectrumPlugin(GObject.Object, Peas.Activatable):
     '''
@@ -69,6 +61,16 @@ class SpectrumPlugin(GObject.Object, Peas.Activatable):
 
     # properties
     position = GObject.property(type=int, default=0)
+    renderer = GObject.property(type=str, default='cairo')
+    smoothing = GObject.property(type=bool, default=True)
+    stream_frames = GObject.property(type=bool, default=False)
+    show_stats = GObject.property(type=bool, default=False)
+    loudness = GObject.property(type=bool, default=False)
+    fingerprints = GObject.property(type=bool, default=False)
+    beat_pulse = GObject.property(type=bool, default=False)
+    palette = GObject.property(type=str, default='classic')
+    analysis_preset = GObject.property(type=str, default='balanced')
+    downmix = GObject.property(type=bool, default=False)
 
 
     def __init__(self):
@@ -77,13 +79,23 @@ class SpectrumPlugin(GObject.Object, Peas.Activatable):
         '''
         GObject.Object.__init__(self)
         self.scroll = None
+        self.spectrum = None
+        self.analyser = None
+        self.window = None
+        self.frame_server = None
+        self.fingerprint_recorder = None
+        self.hide_id = None
 
     def do_activate(self):
         '''
         Called by Rhythmbox when the plugin is activated. It creates the
         plugin's source and connects signals to manage the plugin's
         preferences.
+
+        Only the toggle action and the settings binding are set up here; the
+        analyser widget and its GStreamer element are built on first show.
         '''
+        start = time.perf_counter()
 
         self.shell = self.object
         self.db = self.shell.props.db
@@ -95,6 +107,16 @@ class SpectrumPlugin(GObject.Object, Peas.Activatable):
                                             action_state=ActionGroup.TOGGLE,
                                             action_type='app', accel="<Ctrl>s",
                                             tooltip=_("Display spectrum for the current playing song"))
+        self.toggle_action_group.add_action(func=self.toggle_detached,
+                                            action_name='DetachSpectrum', label=_("Spectrum Window"),
+                                            action_state=ActionGroup.TOGGLE,
+                                            action_type='app', accel="<Ctrl><Shift>s",
+                                            tooltip=_("Display the spectrum in its own window"))
+        self.toggle_action_group.add_action(func=self.queue_similar,
+                                            action_name='QueueSimilarSpectrum',
+                                            label=_("Queue Similar Tracks"),
+                                            action_type='app',
+                                            tooltip=_("Add the tracks whose spectrum is most like the playing one to the play queue"))
         self.appshell.insert_action_group(self.toggle_action_group)
         self.appshell.add_app_menuitems(view_menu_ui, 'SpectrumPluginActions', 'view')
         self.scroll = None
@@ -102,17 +124,48 @@ class SpectrumPlugin(GObject.Object, Peas.Activatable):
         self._connect_properties()
         self._connect_signals()
 
-        self.spectrum = SpectrumPlayer(self.shell)
-
         self.play_id = self.shell.props.shell_player.connect('playing-changed', self.playing_changed)
 
+        if self.stream_frames:
+            # not needed for start-up - the server is created once idle
+            GLib.idle_add(self._on_stream_frames_changed)
+
+        if self.fingerprints:
+            GLib.idle_add(self._on_fingerprints_changed)
+
+        self.activation_time = time.perf_counter() - start
+        print("spectrum: module import %.2f ms, activation %.2f ms" %
+              (IMPORT_TIME * 1000, self.activation_time * 1000))
+
     def do_deactivate(self):
         '''
         Called by Rhythmbox when the plugin is deactivated. It makes sure to
         free all the resources used by the plugin.
         '''
         self.appshell.cleanup()
-        self.spectrum.cleanup()
+        if self.hide_id:
+            GLib.source_remove(self.hide_id)
+            self.hide_id = None
+
+        if self.window:
+            self.window.cleanup()
+            self.window = None
+
+        if self.frame_server:
+            self.frame_server.stop()
+            self.frame_server = None
+
+        if self.fingerprint_recorder:
+            self.fingerprint_recorder.cleanup()
+            self.fingerprint_recorder = None
+
+        if self.spectrum:
+            self.spectrum.cleanup()
+            self.spectrum = None
+
+        if self.analyser:
+            self.analyser.stop()
+            self.analyser = None
 
         self.shell.props.shell_player.disconnect(self.play_id)
 
@@ -129,9 +182,39 @@ class SpectrumPlugin(GObject.Object, Peas.Activatable):
 
         setting.bind(gs.PluginKey.POSITION, self, 'position',
                      Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.RENDERER, self, 'renderer',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.SMOOTHING, self, 'smoothing',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.STREAM_FRAMES, self, 'stream_frames',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.SHOW_STATS, self, 'show_stats',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.LOUDNESS, self, 'loudness',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.FINGERPRINTS, self, 'fingerprints',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.BEAT_PULSE, self, 'beat_pulse',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.PALETTE, self, 'palette',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.ANALYSIS_PRESET, self, 'analysis_preset',
+                     Gio.SettingsBindFlags.GET)
+        setting.bind(gs.PluginKey.DOWNMIX, self, 'downmix',
+                     Gio.SettingsBindFlags.GET)
 
     def _connect_signals(self):
         self.connect('notify::position', self._on_position_changed)
+        self.connect('notify::renderer', self._on_renderer_changed)
+        self.connect('notify::smoothing', self._on_smoothing_changed)
+        self.connect('notify::stream-frames', self._on_stream_frames_changed)
+        self.connect('notify::show-stats', self._on_show_stats_changed)
+        self.connect('notify::loudness', self._on_loudness_changed)
+        self.connect('notify::fingerprints', self._on_fingerprints_changed)
+        self.connect('notify::beat-pulse', self._on_beat_pulse_changed)
+        self.connect('notify::palette', self._on_palette_changed)
+        self.connect('notify::analysis-preset', self._on_analysis_preset_changed)
+        self.connect('notify::downmix', self._on_downmix_changed)
 
     def _get_rb_location(self):
         if self.position == 1:
@@ -147,316 +230,236 @@ class SpectrumPlugin(GObject.Object, Peas.Activatable):
         if not self.scroll or self.position == 0:
             return
 
+        new_location = self._get_rb_location()
+        if new_location == self.current_location:
+            return
 
+        # move the existing scroll (and the analyser it holds) to the new
+        # location - the filter chain and peak history are left untouched
         visible = self.scroll.get_visible()
 
-        new_location = self._get_rb_location()
-
-        self.scroll.hide()
-        self.spectrum.cleanup()
-        del self.spectrum
         self.shell.remove_widget(self.scroll,
-                                     self.current_location)
-        del self.scroll
-        self.spectrum = SpectrumPlayer(self.shell)
-        self.scroll = None
+                                 self.current_location)
         self.current_location = new_location
+        self.shell.add_widget(self.scroll,
+                              self.current_location, expand=True, fill=True)
 
-        GLib.idle_add(self._make_visible, visible)
+        if visible:
+            self.scroll.show_all()
+        else:
+            self.scroll.hide()
         
-    def playing_changed(self, shell_player, playing):
-        GLib.idle_add(self._make_visible, playing)
+    def _on_renderer_changed(self, *args):
+        if self.spectrum:
+            self.spectrum.set_renderer(self.renderer)
 
-    def toggle_visibility(self, action, param=None, data=None):
-        action = self.toggle_action_group.get_action('ToggleSpectrum')
+        if self.window:
+            self.window.spectrum.set_renderer(self.renderer)
 
-        self._make_visible(action.get_active())
+    def _on_smoothing_changed(self, *args):
+        if self.spectrum:
+            self.spectrum.set_smoothing(self.smoothing)
 
-    def _make_visible(self, playing):
-        if playing:
+    def _on_show_stats_changed(self, *args):
+        if self.spectrum:
+            self.spectrum.set_show_stats(self.show_stats)
 
-            self.spectrum.initialise(self.shell)
-            self.spectrum.show_all()
-            if not self.scroll:
-                self.scroll = Gtk.ScrolledWindow()#Gtk.Box()
-                self.scroll.add(self.spectrum)
-                self.scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
-                self.scroll.set_resize_mode(Gtk.ResizeMode.QUEUE)
+        if self.window:
+            self.window.spectrum.set_show_stats(self.show_stats)
 
-                self.current_location = self._get_rb_location()
-                self.shell.add_widget(self.scroll,
-                                      self.current_location, expand=True, fill=True)
-                # temporarily change expand to True - something has happened in latest GTK 3,18 and later that
-                # fails to give the right size allocation to new objects
-            self.scroll.show_all()
-        elif self.scroll:
-            self.scroll.hide()
-            
-
-class SpectrumPlayer(Gtk.DrawingArea):
-    __gsignals__ = {
-        "spectrum-data-found": (GObject.SIGNAL_RUN_LAST,
-                                GObject.TYPE_NONE,
-                                (GObject.TYPE_PYOBJECT,))
-    }
-
-    def __init__(self, shell):
-        super(SpectrumPlayer, self).__init__()
-
-        # init
-        self.bus_id = None
-        self.player_id = None
-        self.shell = None
-
-        self.max_bands = 64
-        self.min_band_width = 4
-        self.spect_height = 100
-        self.spect_bands = self.max_bands
-        self.spect_atom = float(self.max_bands)
-        self.height_scale = 1.0
-        self.band_width = self.min_band_width
-        self.band_interval = 3
-        self.spect_data = None
-        self.threshold = -60
-
-        self.first_initialised = None
-
-        self.connect("spectrum-data-found", self.on_event_load_spect)
-
-        #self.set_size_request(self.adjust_width, self.spect_height)
-        self.props.hexpand = True
-        #self.props.vexpand = True
-        self.connect("draw", self.draw_cb)
-        self.connect("configure-event", self.on_configure_event)
-
-        self.drag_flag = False
-        self.mouse_x = self.mouse_y = 0
-        self.old_x = self.old_y = 0
-
-        self.max_magnitude = []
-        Gdk.threads_add_timeout(GLib.PRIORITY_DEFAULT_IDLE, 400, self.max_levels, None)
-
-        player = shell.props.shell_player.props.player
-        #player.add_filter(self.spectrum)
-
-        print(player)
-        if not hasattr(player.props, "playbin") or not player.props.playbin:
-            self.player_id = player.connect('notify', self.on_player_notify)
-            print("player id connected")
-        else:
-            bus = player.props.playbin.get_bus()
-            self.bus_id = bus.connect('message', self.message_handler)
+    def _on_beat_pulse_changed(self, *args):
+        if self.spectrum:
+            self.spectrum.set_pulse(self.beat_pulse)
 
-    def initialise(self, shell):
-        print("initialise")
-        if self.first_initialised:
-            return
+        if self.window:
+            self.window.spectrum.set_pulse(self.beat_pulse)
 
-        self.first_initialised = True
-        #if self.player_id or self.bus_id:
-        #    return
-
-        self.shell = shell
-
-        Gst.init([])
-        self.spectrum = Gst.ElementFactory.make("spectrum", "spectrum")
-        self.spectrum.set_property("bands", int(self.spect_bands))
-        self.spectrum.set_property("threshold", self.threshold)  # default -60
-        self.spectrum.set_property("post-messages", True)
-        self.spectrum.set_property('message-magnitude', True)
-
-        player = shell.props.shell_player.props.player
-        player.add_filter(self.spectrum)
-
-
-    def cleanup(self):
-        if self.player_id:
-            print("player id cleanup")
-            self.disconnect(self.player_id)
-            self.player_id = None
-
-        if self.bus_id:
-            print("bus id cleanup")
-            self.disconnect(self.bus_id)
-            self.bus_id = None
-
-        if self.shell:
-            player = self.shell.props.shell_player.props.player
-            player.remove_filter(self.spectrum)
-
-    def message_handler(self, bus, message):
-        if message.type == Gst.MessageType.ELEMENT:
-            s = message.get_structure()
-            name = s.get_name()
-
-            if name == "spectrum":
-                waittime = 0
-                #if s.has_field("running_time") and s.has_field("duration"):
-                #    timestamp = s.get_value("running_time")
-                #    duration = s.get_value("duration")
-                #    waittime = timestamp + duration / 2
-                if s.has_field("stream-time") and s.has_field("duration"):
-                    waittime = s.get_value("stream-time") + s.get_value("duration")
-
-                if waittime:
-                    # workaround bug where the magnitude field is a type not understood in python
-                    fullstr = s.to_string()
-                    magstr = fullstr[fullstr.find('{') + 1: fullstr.rfind('}') - 1]
-                    magnitude_list = [float(x) for x in magstr.split(',')]
-                    self.emit("spectrum-data-found", magnitude_list)
+    def _on_palette_changed(self, *args):
+        palette = self._palette()
+        if self.spectrum:
+            self.spectrum.set_palette(palette)
 
-        return True
+        if self.window:
+            self.window.spectrum.set_palette(palette)
 
-    def on_player_notify(self, widget, spec):
-        print("notify")
-        print(spec.name)
+    def _palette(self):
+        from spectrum_palette import Palette
 
-        if self.bus_id:
-            return
-
-        if spec.name == "playbin":
-            playbin = widget.get_property('playbin')
-            bus = playbin.get_bus()
-        elif spec.name == "bus":
-            bus = widget.get_property('bus')
+        return Palette.from_string(self.palette)
 
-        if bus:
-            self.bus_id = bus.connect('message', self.message_handler)
+    def _on_analysis_preset_changed(self, *args):
+        if self.analyser:
+            self.analyser.set_preset(self.analysis_preset)
 
-    def on_player_tee_removed(self, pbin, tee, element):
-        if element != self.spectrum:
-            return
-        self.spectrum.set_state(gst.STATE_NULL)
+    def _on_downmix_changed(self, *args):
+        if self.analyser:
+            self.analyser.set_downmix(self.downmix)
 
-    @property
-    def adjust_width(self):
-        return (self.band_width + self.band_interval) * self.spect_bands
+    def _on_loudness_changed(self, *args):
+        if self.analyser:
+            self.analyser.set_loudness(self.loudness)
 
-    def max_levels(self, *args):
-        if len(self.max_magnitude) == 0:
-            return True
+    def _on_stream_frames_changed(self, *args):
+        if self.stream_frames and not self.frame_server:
+            from spectrum_stream import FrameServer
 
-        max_value = self.threshold * self.height_scale
-        for i in range(int(self.spect_bands)):
+            self._create_analyser()
+            self.frame_server = FrameServer(self.analyser)
+            self.frame_server.start()
+        elif not self.stream_frames and self.frame_server:
+            self.frame_server.stop()
+            self.frame_server = None
 
-            if self.max_magnitude[i] > max_value:
-                self.max_magnitude[i] -= 1 
-                
-        return True
+        return False
 
-    def draw_cb(self, widget, cr):
-        rect = widget.get_allocation()
+    def _on_fingerprints_changed(self, *args):
+        if self.fingerprints and not self.fingerprint_recorder:
+            from spectrum_fingerprint import FingerprintRecorder
 
-        cr.set_operator(cairo.OPERATOR_SOURCE)
-        #cr.set_source_rgba(1.0, 1.0, 1.0, 0.0)
-        context = self.get_toplevel().get_style_context()
-        bg_colour = context.get_background_color(Gtk.StateFlags.NORMAL)
-        Gdk.cairo_set_source_rgba(cr, bg_colour)
-        cr.rectangle(0, 0, rect.width, rect.height)
-        cr.fill()
+            self._create_analyser()
+            self.fingerprint_recorder = FingerprintRecorder(self.shell, self.analyser)
+        elif not self.fingerprints and self.fingerprint_recorder:
+            self.fingerprint_recorder.cleanup()
+            self.fingerprint_recorder = None
 
-        cr.set_operator(cairo.OPERATOR_OVER)
-        self.draw_spectrum(cr)
-        return True
+        return False
 
+    def playing_changed(self, shell_player, playing):
+        # track changes can report playback stopped for a moment - hiding
+        # straight away would make the display flash and its peaks and
+        # smoothing start again, so only hide once playback stays stopped
+        if self.hide_id:
+            GLib.source_remove(self.hide_id)
+            self.hide_id = None
 
-    def delayed_idle_spectrum_update(self, spect):
-        self.spect_data = spect
-        #print (len(self.max_magnitude))
-        #print (range(int(self.spect_bands)))
-        for i in range(int(self.spect_bands)):
-            if -spect[i] < -self.max_magnitude[i]:
-                self.max_magnitude[i] = spect[i]
+        if playing:
+            GLib.idle_add(self._make_visible, True)
+        else:
+            self.hide_id = GLib.timeout_add(HIDE_DELAY, self._on_hide_timeout)
 
-        self.queue_draw()
+    def _on_hide_timeout(self):
+        self.hide_id = None
+        self._make_visible(False)
 
         return False
 
-    def on_event_load_spect(self, obj, magnitude_list):
-        spect = [i * self.height_scale for i in magnitude_list]
+    def toggle_visibility(self, action, param=None, data=None):
+        action = self.toggle_action_group.get_action('ToggleSpectrum')
+
+        self._make_visible(action.get_active())
 
-        #AUDIOFREQ=32000.0
-        #for i in range(int(self.spect_bands)):
-        #    freq = ((AUDIOFREQ / 2) * i + AUDIOFREQ / 4) / self.spect_bands
-        #    mag = magnitude_list[i]
+    def toggle_detached(self, action, param=None, data=None):
+        action = self.toggle_action_group.get_action('DetachSpectrum')
 
-        #    print ('band %d freq %g mag %f' % (i, freq, mag))
+        if action.get_active():
+            self._detach()
+        else:
+            self._attach()
+
+    def queue_similar(self, action, param=None, data=None):
+        if not self.fingerprint_recorder:
+            print("spectrum: fingerprints are off - no similar tracks to queue")
+            return
 
-        GLib.idle_add(self.delayed_idle_spectrum_update, spect)
+        queue = self.shell.props.queue_source
+        for distance, location in self.fingerprint_recorder.similar():
+            entry = self.db.entry_lookup_by_location(location)
+            if entry:
+                queue.add_entry(entry, -1)
 
-    def on_configure_event(self, widget, event):
-        print("on_configure_event")
-        print (event.width)
-        self.spect_height = event.height
-        self.height_scale = event.height / self.spect_atom
-        self.spect_bands = event.width / (self.band_width + self.band_interval)
+    def _detach(self):
+        if self.window:
+            return
 
-        if self.spect_bands >= self.max_bands:
-            self.spect_bands = self.max_bands
+        if not self.spectrum:
+            self._create_spectrum()
 
-            self.band_width = event.width / (self.max_bands + self.band_interval)
+        # the embedded view stops drawing entirely whilst detached
+        if self.scroll:
+            self.scroll.hide()
+        self.spectrum.cleanup()
 
-        if self.spect_bands < self.max_bands:
-            self.band_width = event.width / (self.max_bands + self.band_interval)
+        from spectrum_window import SpectrumWindow
 
-            if self.band_width < self.min_band_width:
-                self.band_width = self.min_band_width
-                self.spect_bands = event.width / (self.band_width + self.band_interval)
-            else:
-                self.spect_bands = self.max_bands
+        self.window = SpectrumWindow(self.analyser, self.renderer)
+        self.window.spectrum.set_show_stats(self.show_stats)
+        self.window.spectrum.set_pulse(self.beat_pulse)
+        self.window.spectrum.set_palette(self._palette())
+        self.window.connect('delete-event', self._on_window_delete)
+        self.window.present_spectrum()
 
-        print (int(self.spect_bands))
-        if int(self.spect_bands) == 0:
-            return False
-            
-        self.spectrum.set_property("bands", int(self.spect_bands))
+    def _attach(self):
+        if not self.window:
+            return
 
-        self.max_magnitude = []
-        print(self.height_scale)
-        for i in range(int(self.spect_bands)):
-            #print (i)
-            self.max_magnitude.append(self.threshold * self.height_scale)
-            
-        print (self.max_magnitude)
+        self.window.cleanup()
+        self.window = None
 
-        return False
+        # playback may have started or stopped whilst detached
+        if self.shell.props.shell_player.props.playing:
+            self._make_visible(True)
 
-    def draw_spectrum(self, cr):
-        start = 5
-        data = self.spect_data
-        if data:
-            for i in range(int(self.spect_bands)):
-                if i < 2:
-                    continue # ignore the bottom end of the spectrum
-                cr.push_group()
-                cr.set_source_rgb(0, 1, 1)
-                rect = Rect(start, -data[i], self.band_width, self.spect_height + data[i])
-
-                cr.set_line_width(1.5)
-                min_pos = 0
-                cr.move_to(start, min_pos - self.max_magnitude[i])
-                cr.line_to(start + self.band_width, min_pos - self.max_magnitude[i])
-                cr.stroke()
-
-                rect = Rect(start, -data[i], self.band_width, self.spect_height + data[i])
-
-                pattern = cairo.LinearGradient(rect.x, rect.y, rect.x, rect.y + rect.height)
-                for i, each_linear in enumerate(LINEAR_COLORS):
-                    pattern.add_color_stop_rgb(LINEAR_POS[i],
-                                               each_linear[0],
-                                               each_linear[1],
-                                               each_linear[2])
-
-                    cr.set_source(pattern)
-
-                cr.rectangle(*rect)
-                cr.fill()
-                cr.pop_group_to_source()
-                cr.paint_with_alpha(0.5)
-                start += self.band_width + self.band_interval
+    def _on_window_delete(self, window, event):
+        # unticking the action re-attaches the embedded view
+        action = self.toggle_action_group.get_action('DetachSpectrum')
+        action.set_active(False)
+
+        return True
+
+    def _make_visible(self, playing):
+        if self.window:
+            # detached - the embedded view stays hidden
+            return
+
+        if playing:
+            if not self.spectrum:
+                self._create_spectrum()
+
+            self.spectrum.initialise()
+            self.spectrum.show_all()
+            if not self.scroll:
+                self.scroll = Gtk.ScrolledWindow()#Gtk.Box()
+                self.scroll.add(self.spectrum.set_renderer(self.renderer))
+                self.scroll.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+                self.scroll.set_resize_mode(Gtk.ResizeMode.QUEUE)
+
+                self.current_location = self._get_rb_location()
+                self.shell.add_widget(self.scroll,
+                                      self.current_location, expand=True, fill=True)
+                # temporarily change expand to True - something has happened in latest GTK 3,18 and later that
+                # fails to give the right size allocation to new objects
+            self.scroll.show_all()
+        elif self.scroll:
+            self.scroll.hide()
+
+    def _create_analyser(self):
+        if not self.analyser:
+            # deferred so that GStreamer is only loaded once needed
+            from spectrum_analysis import SpectrumAnalyser
+
+            self.analyser = SpectrumAnalyser(self.shell, self.analysis_preset)
+            self.analyser.set_loudness(self.loudness)
+            self.analyser.set_downmix(self.downmix)
+
+    def _create_spectrum(self):
+        start = time.perf_counter()
+
+        # deferred so that GStreamer, Gdk and cairo are only loaded once the
+        # analyser is actually shown
+        from spectrum_player import SpectrumPlayer
+
+        self._create_analyser()
+        self.spectrum = SpectrumPlayer(self.analyser)
+        self.spectrum.set_smoothing(self.smoothing)
+        self.spectrum.set_show_stats(self.show_stats)
+        self.spectrum.set_pulse(self.beat_pulse)
+        self.spectrum.set_palette(self._palette())
+        print("spectrum: analyser created in %.2f ms" %
+              ((time.perf_counter() - start) * 1000))
 
     def _import(self):
         # stop PyCharm removing the Preference import on optimisation
         pref = Preferences()
 
-                
+
+IMPORT_TIME = time.perf_counter() - _import_start
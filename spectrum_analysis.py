@@ -0,0 +1,554 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# shared analysis - one spectrum element and bus connection whose decoded
+# frames are published to every view that subscribes
+
+from array import array
+import time
+
+from gi.repository import Gst
+from gi.repository import GLib
+
+from spectrum_loudness import LoudnessMeter
+from spectrum_signals import SignalConnections
+
+# decoded frames held for subscribers that need every frame - a longer
+# stall of the main loop than this many frames loses the oldest
+RING_FRAMES = 16
+
+
+def parse_values(structure_string, field):
+    '''
+    returns the list of doubles held in a list or array field of a
+    serialised Gst.Structure - python cannot read these fields directly
+    '''
+    start = structure_string.find(' ' + field + '=')
+    if start < 0:
+        return []
+
+    brace = structure_string.find('{', start)
+    angle = structure_string.find('<', start)
+    if brace < 0 or (0 <= angle < brace):
+        first, close = angle, '>'
+    else:
+        first, close = brace, '}'
+    if first < 0:
+        return []
+
+    end = structure_string.find(close, first)
+    return [float(x) for x in structure_string[first + 1:end].split(',') if x.strip()]
+
+
+# analysis settings - bands sets the FFT size (2 * bands - 2 samples) and
+# interval the seconds between frames. The spectrum element always applies
+# a Hamming window and averages the FFTs over each interval, so these are
+# the only two choices it offers.
+PRESETS = {
+    'balanced': dict(bands=64, interval=0.1),
+    'low-latency': dict(bands=64, interval=0.033),
+    'high-resolution': dict(bands=512, interval=0.1),
+    'low-cpu': dict(bands=32, interval=0.2),
+}
+
+DEFAULT_PRESET = 'balanced'
+
+# format the audio is reduced to before the FFT when downmixing - the
+# display covers up to half this rate
+DOWNMIX_CAPS = "audio/x-raw,channels=1,rate=22050"
+
+
+class AnalysisBin(Gst.Bin):
+    '''
+    'level ! spectrum' analysis filter inserted into the player. The
+    analysis can be changed between presets whilst it is playing.
+
+    When downmixing, the spectrum runs on a branch of its own:
+
+      level ! tee ! (playback)
+              tee ! queue ! audioconvert ! audioresample ! mono 22.05 kHz !
+                    spectrum ! fakesink
+
+    so the FFT sees a fraction of the samples whilst the audio played is
+    untouched. The branch queue is leaky - if the analysis falls behind it
+    loses buffers rather than holding up playback.
+
+    :param preset: `str` name of one of the PRESETS
+    :param threshold: `int` dB level treated as silence
+    :param downmix: `bool` analyse mono audio at a reduced rate
+    '''
+
+    def __init__(self, preset=DEFAULT_PRESET, threshold=-60, downmix=False):
+        super(AnalysisBin, self).__init__(name="spectrum-analysis")
+        self.downmix = downmix
+
+        self.spectrum = Gst.ElementFactory.make("spectrum", "spectrum")
+        self.spectrum.set_property("threshold", threshold)  # default -60
+        self.spectrum.set_property("post-messages", True)
+        self.spectrum.set_property('message-magnitude', True)
+
+        # level runs on the same buffers as the spectrum - RMS and peaks for
+        # the loudness meter without a second tap on the audio
+        self.level = Gst.ElementFactory.make("level", "spectrum-level")
+        self.level.set_property("post-messages", False)
+
+        self.add(self.level)
+        self.add(self.spectrum)
+        self.add_pad(Gst.GhostPad.new("sink", self.level.get_static_pad("sink")))
+
+        if downmix:
+            self._add_downmix_branch()
+        else:
+            self.level.link(self.spectrum)
+            self.add_pad(Gst.GhostPad.new("src", self.spectrum.get_static_pad("src")))
+
+        self.preset = None
+        self.set_preset(preset)
+
+    def _add_downmix_branch(self):
+        tee = Gst.ElementFactory.make("tee", "spectrum-tee")
+        queue = Gst.ElementFactory.make("queue", "spectrum-queue")
+        queue.set_property("leaky", 2)  # downstream - drop the oldest
+        convert = Gst.ElementFactory.make("audioconvert", "spectrum-convert")
+        resample = Gst.ElementFactory.make("audioresample", "spectrum-resample")
+        capsfilter = Gst.ElementFactory.make("capsfilter", "spectrum-caps")
+        capsfilter.set_property("caps", Gst.Caps.from_string(DOWNMIX_CAPS))
+        sink = Gst.ElementFactory.make("fakesink", "spectrum-sink")
+        # the analysis must not take part in prerolling or clock sync
+        sink.set_property("sync", False)
+        sink.set_property("async", False)
+
+        for element in (tee, queue, convert, resample, capsfilter, sink):
+            self.add(element)
+
+        self.level.link(tee)
+        for upstream, downstream in ((tee, queue), (queue, convert),
+                                     (convert, resample), (resample, capsfilter),
+                                     (capsfilter, self.spectrum),
+                                     (self.spectrum, sink)):
+            upstream.link(downstream)
+
+        self.add_pad(Gst.GhostPad.new("src", tee.get_request_pad("src_%u")))
+
+    @property
+    def bands(self):
+        return PRESETS[self.preset]['bands']
+
+    @property
+    def interval(self):
+        return PRESETS[self.preset]['interval']
+
+    @property
+    def fft_size(self):
+        return 2 * self.bands - 2
+
+    def set_preset(self, preset):
+        if preset not in PRESETS:
+            print("unknown spectrum analysis preset '%s'" % preset)
+            preset = DEFAULT_PRESET
+
+        self.preset = preset
+        # both elements accept new settings whilst running
+        self.spectrum.set_property("bands", self.bands)
+        self.set_interval(self.interval)
+
+    def set_interval(self, seconds):
+        '''
+        overrides the preset's time between frames
+        '''
+        interval = int(seconds * Gst.SECOND)
+        self.spectrum.set_property("interval", interval)
+        self.level.set_property("interval", interval)
+
+    def set_level_messages(self, enabled):
+        self.level.set_property("post-messages", enabled)
+
+
+def read_magnitudes(structure, frame):
+    '''
+    decodes the magnitudes of a spectrum message into frame, an array('d');
+    returns frame, or a new array if the number of bands has changed
+    '''
+    # workaround bug where the magnitude field is a type not understood in python
+    fullstr = structure.to_string()
+    magstr = fullstr[fullstr.find('{') + 1: fullstr.rfind('}') - 1]
+    values = magstr.split(',')
+    if len(values) != len(frame):
+        frame = array('d', [0.0] * len(values))
+
+    for i, value in enumerate(values):
+        frame[i] = float(value)
+
+    return frame
+
+
+class Subscriber(object):
+    '''
+    a view registered with the SpectrumAnalyser
+
+    :param callback: function called with the band magnitudes (dB) of the
+      latest frame, at most once per main loop iteration. This is the
+      analyser's frame store, overwritten by a later frame - copy it to
+      keep it. None if only `every_frame` is wanted
+    :param max_fps: `int` maximum frames per second delivered to callback;
+      0 for no limit
+    :param every_frame: function called, in order, with each frame decoded
+      since the last delivery; not rate limited. analyser.stream_time is
+      the position of the frame being passed
+    '''
+
+    def __init__(self, callback, max_fps=0, every_frame=None):
+        self.callback = callback
+        self.every_frame = every_frame
+        self.set_max_fps(max_fps)
+        self.last_time = 0
+        self.dropped = 0
+
+    def set_max_fps(self, max_fps):
+        self.max_fps = max_fps
+        # minimum time between frames in microseconds
+        self.min_interval = 1000000 // max_fps if max_fps else 0
+
+
+class SpectrumAnalyser(object):
+    '''
+    owns the GStreamer analysis bin (level and spectrum elements) inserted
+    into the player and parses each of its messages once, whatever the
+    number of views showing it
+    '''
+
+    def __init__(self, shell, preset=DEFAULT_PRESET, threshold=-60):
+        self.shell = shell
+        if preset not in PRESETS:
+            preset = DEFAULT_PRESET
+        self.preset = preset
+        self.bands = PRESETS[preset]['bands']
+        self.threshold = threshold
+        # seconds between analysis messages
+        self.interval = PRESETS[preset]['interval']
+
+        self.bin = None
+        self.player = None
+        # the caps, song, player and bus handlers - the bus is only ever
+        # connected once, however many notifications announce it
+        self.connections = SignalConnections()
+
+        self.subscribers = []
+        # number of spectrum messages decoded
+        self.frames = 0
+
+        # each message is decoded into the next of these preallocated
+        # frames; subscribers are notified from one idle callback, so a
+        # burst of messages costs one delivery per main loop iteration
+        self.ring = [array('d', [float(threshold)] * self.bands)
+                     for i in range(RING_FRAMES)]
+        # stream position (ns) of each frame in the ring
+        self.ring_times = [0] * RING_FRAMES
+        # the latest frame
+        self.frame = self.ring[0]
+        # number of frames handed to the every frame subscribers, and the
+        # number that were overwritten before they could be
+        self.delivered = 0
+        self.lost = 0
+        # number (counted from 1) of the frame being delivered
+        self.frame_number = 0
+        # monotonic time (us) the stored frame was decoded
+        self.frame_time = 0
+        self.notify_id = None
+        # number of deliveries made to the subscribers
+        self.notifications = 0
+        # average seconds spent decoding a spectrum message
+        self.parse_time = 0.0
+        # stream position (ns) of the most recent frame
+        self.stream_time = 0
+        # format of the audio reaching the spectrum element, and of the
+        # audio played - they differ when downmixing
+        self.rate = 0
+        self.channels = 0
+        self.source_rate = 0
+        self.source_channels = 0
+        self.downmix = False
+
+        self.meter = LoudnessMeter(self.interval, self.threshold)
+        self.loudness = False
+
+    def start(self):
+        '''
+        inserts the spectrum element and starts listening for its messages
+        '''
+        if self.bin:
+            return
+
+        Gst.init([])
+        self._create_bin()
+
+        connections = self.connections
+        shell_player = self.shell.props.shell_player
+        connections.connect('song', shell_player, 'playing-song-changed',
+                            self.on_playing_song_changed)
+
+        self.player = shell_player.props.player
+
+        print(self.player)
+        if not hasattr(self.player.props, "playbin") or not self.player.props.playbin:
+            connections.connect('player', self.player, 'notify',
+                                self.on_player_notify)
+            print("player id connected")
+        else:
+            self._connect_bus(self.player.props.playbin.get_bus())
+
+        self.player.add_filter(self.bin)
+
+    def _create_bin(self):
+        self.bin = AnalysisBin(self.preset, self.threshold, self.downmix)
+        self.bin.set_level_messages(self.loudness)
+
+        connections = self.connections
+        connections.connect('caps', self.bin.spectrum.get_static_pad("sink"),
+                            'notify::caps', self.on_caps_changed)
+        connections.connect('source-caps', self.bin.level.get_static_pad("sink"),
+                            'notify::caps', self.on_source_caps_changed)
+
+    def stop(self):
+        if self.notify_id:
+            GLib.source_remove(self.notify_id)
+            self.notify_id = None
+
+        print("signal handler cleanup")
+        self.connections.disconnect_all()
+
+        if self.bin:
+            self.player.remove_filter(self.bin)
+            self.bin = None
+
+    def set_loudness(self, enabled):
+        '''
+        turns the loudness meter on or off
+        '''
+        self.loudness = enabled
+        self.meter.reset_track()
+        if self.bin:
+            self.bin.set_level_messages(enabled)
+
+    def set_downmix(self, enabled):
+        '''
+        turns the reduced rate mono analysis branch on or off. Unlike the
+        other settings this needs a new analysis bin.
+        '''
+        if enabled == self.downmix:
+            return
+
+        self.downmix = enabled
+        self.rate = 0
+        self.channels = 0
+        if self.bin:
+            self.connections.disconnect('caps')
+            self.connections.disconnect('source-caps')
+            self.player.remove_filter(self.bin)
+            self._create_bin()
+            self.player.add_filter(self.bin)
+
+    @property
+    def sample_ratio(self):
+        '''
+        fraction of the played samples the spectrum element processes, or
+        0 if not known yet
+        '''
+        played = self.source_rate * self.source_channels
+        if not played or not self.rate:
+            return 0.0
+
+        return self.rate * max(self.channels, 1) / float(played)
+
+    def set_preset(self, preset):
+        '''
+        changes the analysis to one of the PRESETS; the analysis bin stays
+        in the pipeline. Subscribers see the band count change with the
+        length of the frames.
+        '''
+        if preset not in PRESETS:
+            preset = DEFAULT_PRESET
+        if preset == self.preset:
+            return
+
+        self.preset = preset
+        self.bands = PRESETS[preset]['bands']
+        self.interval = PRESETS[preset]['interval']
+        self.meter = LoudnessMeter(self.interval, self.threshold)
+        self.parse_time = 0.0
+
+        if self.bin:
+            self.bin.set_preset(preset)
+
+    def volume(self):
+        return self.shell.props.shell_player.props.volume
+
+    def on_caps_changed(self, pad, spec):
+        # called from the streaming thread - just note the format
+        caps = pad.get_current_caps()
+        if caps:
+            s = caps.get_structure(0)
+            self.rate = s.get_value('rate') or 0
+            self.channels = s.get_value('channels') or 0
+
+    def on_source_caps_changed(self, pad, spec):
+        caps = pad.get_current_caps()
+        if caps:
+            s = caps.get_structure(0)
+            self.source_rate = s.get_value('rate') or 0
+            self.source_channels = s.get_value('channels') or 0
+
+    def on_playing_song_changed(self, shell_player, entry):
+        self.meter.reset_track()
+
+    def subscribe(self, callback=None, max_fps=0, every_frame=None):
+        '''
+        registers a view or other consumer of the frames; returns the
+        `Subscriber` to pass to unsubscribe
+        '''
+        if not self.subscribers:
+            # frames decoded whilst nobody was listening are not owed
+            self.delivered = self.frames
+        subscriber = Subscriber(callback, max_fps, every_frame)
+        self.subscribers.append(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    @property
+    def bus(self):
+        return self.connections.owner('bus')
+
+    @property
+    def parsers(self):
+        '''
+        number of bus message handlers connected by all analysers - one
+        unless handlers have leaked
+        '''
+        return SignalConnections.count('message')
+
+    def _connect_bus(self, bus):
+        if self.connections.connect('bus', bus, 'message', self.message_handler):
+            # the player's notifications are no longer needed
+            self.connections.disconnect('player')
+
+    def message_handler(self, bus, message):
+        if message.type != Gst.MessageType.ELEMENT or \
+                not (self.subscribers or self.loudness):
+            return True
+
+        s = message.get_structure()
+        name = s.get_name()
+
+        if name == "level":
+            fullstr = s.to_string()
+            self.meter.add_level(parse_values(fullstr, 'rms'),
+                                 parse_values(fullstr, 'peak'))
+        elif name == "spectrum":
+            waittime = 0
+            #if s.has_field("running_time") and s.has_field("duration"):
+            #    timestamp = s.get_value("running_time")
+            #    duration = s.get_value("duration")
+            #    waittime = timestamp + duration / 2
+            if s.has_field("stream-time") and s.has_field("duration"):
+                self.stream_time = s.get_value("stream-time")
+                waittime = self.stream_time + s.get_value("duration")
+
+            if waittime:
+                start = time.perf_counter()
+                slot = self.frames % RING_FRAMES
+                frame = self.ring[slot] = read_magnitudes(s, self.ring[slot])
+                self.ring_times[slot] = self.stream_time
+                self.frame = frame
+
+                self.frames += 1
+                self.frame_time = GLib.get_monotonic_time()
+                self.parse_time += (time.perf_counter() - start - self.parse_time) * 0.1
+
+                if self.loudness and self.rate:
+                    self.meter.set_format(self.rate, len(frame),
+                                          self.source_channels or self.channels)
+                    self.meter.add_spectrum(frame)
+
+                if self.subscribers and not self.notify_id:
+                    self.notify_id = GLib.idle_add(self._notify)
+
+        return True
+
+    def _notify(self):
+        self.notify_id = None
+        self.notifications += 1
+
+        first = self.delivered
+        if self.frames - first > RING_FRAMES:
+            # the main loop stalled for longer than the ring holds
+            self.lost += self.frames - first - RING_FRAMES
+            first = self.frames - RING_FRAMES
+        self.delivered = self.frames
+
+        latest_time = self.stream_time
+        consumers = [subscriber.every_frame for subscriber in self.subscribers
+                     if subscriber.every_frame]
+        if consumers:
+            for number in range(first, self.frames):
+                slot = number % RING_FRAMES
+                self.frame_number = number + 1
+                self.stream_time = self.ring_times[slot]
+                for every_frame in consumers:
+                    every_frame(self.ring[slot])
+            self.stream_time = latest_time
+
+        self.frame_number = self.frames
+        self.publish(self.frame)
+
+        return False
+
+    def publish(self, magnitude_list):
+        now = GLib.get_monotonic_time()
+
+        # a copy - subscribers may unsubscribe whilst being called
+        for subscriber in tuple(self.subscribers):
+            if not subscriber.callback:
+                continue
+
+            if now - subscriber.last_time < subscriber.min_interval:
+                subscriber.dropped += 1
+                continue
+
+            subscriber.last_time = now
+            subscriber.callback(magnitude_list)
+
+    def on_player_notify(self, player, spec):
+        print("notify")
+        print(spec.name)
+
+        if self.connections.is_connected('bus'):
+            return
+
+        bus = None
+        if spec.name == "playbin":
+            playbin = player.get_property('playbin')
+            bus = playbin.get_bus()
+        elif spec.name == "bus":
+            bus = player.get_property('bus')
+
+        if bus:
+            self._connect_bus(bus)
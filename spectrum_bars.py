@@ -0,0 +1,142 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+
+# paints the bars of a spectrum view with cairo, without a widget. Used by
+# SpectrumPlayer on the main thread and by the offline exporter from a pool
+# of threads, so nothing here calls GTK.
+
+import math
+
+import cairo
+
+from spectrum_layout import FIRST_BAND
+
+class BarRenderer(object):
+    '''
+    paints bars and peak markers for a `BandLayout` and `Palette`. The
+    gradients are drawn once, when the renderer is created; after that
+    draw() only reads them, so one renderer can be shared by several
+    threads.
+
+    :param cr: `cairo.Context` the gradients are made compatible with
+    :param layout: `BandLayout` of the view
+    :param palette: `Palette` of the bars
+    :param height: `float` height of the view
+    :param window: `Gdk.Window` to create the gradients at its device scale,
+      or None
+    :param scale: `int` device scale of window
+    '''
+
+    def __init__(self, cr, layout, palette, height, window=None, scale=1):
+        self.layout = layout
+        self.palette = palette
+        self.height = height
+        self.surface = self._create_surface(cr, window, scale)
+
+    def _create_surface(self, cr, window, scale):
+        palette = self.palette
+        layout = self.layout
+        if palette.per_band:
+            # each band's column at the x position of its bar
+            width = int(math.ceil(layout.x[-1] + layout.band_width))
+        else:
+            width = int(math.ceil(layout.band_width))
+        height = int(math.ceil(self.height))
+        if window:
+            # an image surface at the display's device scale - cairo does
+            # not have to upscale it when scale factor is more than 1
+            surface = window.create_similar_image_surface(
+                cairo.FORMAT_ARGB32, max(width, 1), max(height, 1), scale)
+        else:
+            surface = cr.get_target().create_similar(cairo.CONTENT_COLOR_ALPHA,
+                                                     max(width, 1), max(height, 1))
+        surface_cr = cairo.Context(surface)
+
+        if palette.per_band:
+            columns = [(layout.x[i], stops)
+                       for i, stops in enumerate(palette.band_stops(layout.bands))
+                       if i >= FIRST_BAND]
+        else:
+            columns = [(0, palette.stops)]
+
+        for x, stops in columns:
+            pattern = cairo.LinearGradient(0, 0, 0, self.height)
+            for position, (r, g, b) in stops:
+                pattern.add_color_stop_rgb(position, r, g, b)
+            surface_cr.set_source(pattern)
+            surface_cr.rectangle(x, 0, layout.band_width, height)
+            surface_cr.fill()
+
+        return surface
+
+    def draw(self, cr, data, peaks, first, end, alpha, use_groups=True):
+        '''
+        draws bands first to end of data with their peak markers.
+        use_groups blends each bar as a whole rather than each part on its
+        own
+        '''
+        bar_surface = self.surface
+        x_offsets = self.layout.x
+        band_width = self.layout.band_width
+        height = self.height
+        peak = self.palette.peak
+        per_band = self.palette.per_band
+        by_level = self.palette.by_level
+
+        for i in range(first, end):
+            start = x_offsets[i]
+            if use_groups:
+                cr.push_group()
+                cr.set_source_rgb(*peak)
+            else:
+                # cheaper - each part is blended on its own
+                cr.set_source_rgba(peak[0], peak[1], peak[2], alpha)
+
+            cr.set_line_width(1.5)
+            cr.move_to(start, -peaks[i])
+            cr.line_to(start + band_width, -peaks[i])
+            cr.stroke()
+
+            top = -data[i]
+            bar_height = height + data[i]
+
+            if bar_height > 0:
+                # x of this band's column in the cached gradients
+                column = start if per_band else 0
+                cr.save()
+                if by_level:
+                    # the bar uncovers its part of the full height gradient
+                    cr.set_source_surface(bar_surface, start - column, 0)
+                    cr.rectangle(start, top, band_width, bar_height)
+                else:
+                    # the full height gradient is squashed to the bar
+                    cr.translate(start, top)
+                    cr.scale(1, bar_height / height)
+                    cr.set_source_surface(bar_surface, -column, 0)
+                    cr.rectangle(0, 0, band_width, height)
+                if use_groups:
+                    cr.fill()
+                else:
+                    cr.clip()
+                    cr.paint_with_alpha(alpha)
+                cr.restore()
+
+            if use_groups:
+                cr.pop_group_to_source()
+                cr.paint_with_alpha(alpha)
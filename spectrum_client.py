@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# reference client for the frames published by spectrum_stream.py - prints
+# the received frame rate, lost frames and publish-to-receive latency.
+#
+# usage: spectrum_client.py [socket path]
+#
+# deliberately has no dependencies so it can be copied into other projects;
+# the record layout must match spectrum_stream.RECORD_FORMAT
+
+import os
+import socket
+import struct
+import sys
+import time
+
+RECORD_FORMAT = '<4sHHIqqI64f'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+def main():
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR', os.path.expanduser('~/.cache'))
+        path = os.path.join(runtime_dir, 'rhythmbox-spectrum.sock')
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    sock.connect(path)
+
+    # reused for every record
+    record = bytearray(RECORD_SIZE)
+    frames = 0
+    lost = 0
+    latency = 0.0
+    sequence = None
+    report_time = time.monotonic()
+
+    while True:
+        if sock.recv_into(record) != RECORD_SIZE:
+            print("connection closed")
+            break
+
+        # CLOCK_MONOTONIC in microseconds, as GLib.get_monotonic_time()
+        received = time.monotonic() * 1000000
+        magic, version, bands, seq, published, stream_time, reserved = \
+            struct.unpack_from('<4sHHIqqI', record)
+        if magic != b'SPEC':
+            print("unexpected record")
+            break
+
+        if sequence is not None and seq != (sequence + 1) & 0xffffffff:
+            lost += (seq - sequence - 1) & 0xffffffff
+        sequence = seq
+
+        frames += 1
+        latency += received - published
+
+        now = time.monotonic()
+        if now - report_time >= 1.0:
+            print("%5.1f frames/s  %d lost  latency %.2f ms  position %.1f s  bands %d" %
+                  (frames / (now - report_time), lost, latency / frames / 1000,
+                   stream_time / 1e9, bands))
+            frames = 0
+            lost = 0
+            latency = 0.0
+            report_time = now
+
+
+if __name__ == '__main__':
+    main()
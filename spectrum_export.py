@@ -0,0 +1,382 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# offline export of a track's spectrum to a video or a sequence of PNG
+# images.
+#
+# The file is first decoded and analysed as fast as it can be, with the
+# same AnalysisBin as playback and one frame per video frame. The frames
+# are then drawn by a BarRenderer - the drawing code of the views, without
+# a widget - into off-screen surfaces, a batch at a time spread over a pool
+# of threads, and pushed into
+#
+#   appsrc ! videoconvert ! x264enc ! mp4mux ! filesink      (.mp4 etc.)
+#   appsrc ! videoconvert ! vp8enc ! webmmux ! filesink      (.webm)
+#
+# or written as PNG files if the output name has a '%d' style pattern.
+#
+# It can also be run on its own:
+#
+#   python3 spectrum_export.py song.ogg spectrum.webm --width 1280 --height 360
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from gi.repository import GLib
+import cairo
+
+from spectrum_analysis import AnalysisBin
+from spectrum_analysis import DEFAULT_PRESET
+from spectrum_analysis import PRESETS
+from spectrum_analysis import read_magnitudes
+from spectrum_bars import BarRenderer
+from spectrum_layout import BandLayout
+from spectrum_layout import DISPLAY_BANDS
+from spectrum_layout import FIRST_BAND
+from spectrum_layout import PEAK_DECAY_INTERVAL
+from spectrum_layout import group_ranges
+from spectrum_layout import lower_peaks
+from spectrum_layout import raise_peaks
+from spectrum_layout import scale_bands
+from spectrum_palette import DEFAULT_PALETTE
+from spectrum_palette import PALETTES
+
+ENCODERS = {
+    '.webm': 'vp8enc deadline=1 ! webmmux',
+    '.mkv': 'x264enc ! matroskamux',
+}
+DEFAULT_ENCODER = 'x264enc ! mp4mux'
+
+
+class SpectrumExporter(object):
+    '''
+    renders the spectrum of an audio file offline
+
+    :param uri: `str` uri of the audio file
+    :param output: `str` path of the video; a name with a '%d' style
+      pattern (e.g. 'frame-%05d.png') writes one PNG image per frame
+    :param width: `int` frame width
+    :param height: `int` frame height
+    :param fps: `int` frames per second
+    :param palette: `Palette` of the bars
+    :param preset: `str` analysis preset - its frame interval is replaced
+      by the video frame rate
+    :param on_done: function called with the exporter once it has finished;
+      `error` is set if it failed
+    '''
+
+    # frames drawn per main loop iteration
+    BATCH = 16
+
+    def __init__(self, uri, output, width=1280, height=360, fps=30,
+                 palette=None, preset=DEFAULT_PRESET, on_done=None):
+        self.uri = uri
+        self.output = output
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.preset = preset
+        self.on_done = on_done
+
+        self.bands = PRESETS[preset]['bands']
+        self.threshold = -60
+        self.interval = 1.0 / fps
+        self.palette = palette or PALETTES[DEFAULT_PALETTE]
+
+        # geometry as a view of this size would draw it - see SpectrumPlayer
+        self.layout = BandLayout(width, height, min(self.bands, DISPLAY_BANDS))
+        self.height_scale = height / float(DISPLAY_BANDS)
+        self.band_ranges = group_ranges(self.bands, self.layout.bands)
+        self.peaks = array('d', [self.threshold * self.height_scale] *
+                            self.layout.bands)
+        self.bars = None
+
+        self.pipeline = None
+        self.appsrc = None
+        self.pool = None
+        self.render_id = None
+        self.wanted = True
+
+        # analysed frames, one per video frame
+        self.frames = []
+        self.frame = array('d')
+        self.rendered = 0
+        self.start_time = 0
+        self.error = None
+
+    @property
+    def duration(self):
+        '''
+        seconds of video rendered so far
+        '''
+        return self.rendered / float(self.fps)
+
+    @property
+    def speed(self):
+        '''
+        render speed as a multiple of real time, analysis included
+        '''
+        elapsed = time.monotonic() - self.start_time
+        if not elapsed:
+            return 0.0
+
+        return self.duration / elapsed
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self._analyse()
+
+    def cancel(self):
+        self._finish("cancelled")
+
+    def _watch(self, pipeline, on_eos):
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect('message', self.on_message, on_eos)
+
+    def on_message(self, bus, message, on_eos):
+        if message.type == Gst.MessageType.EOS:
+            on_eos()
+        elif message.type == Gst.MessageType.ERROR:
+            error, debug = message.parse_error()
+            self._finish(error.message)
+        elif message.type == Gst.MessageType.ELEMENT and \
+                message.get_structure().get_name() == "spectrum":
+            self.frame = read_magnitudes(message.get_structure(), self.frame)
+            self.frames.append(array('d', self.frame))
+
+        return True
+
+    def _analyse(self):
+        pipeline = Gst.Pipeline.new("spectrum-export-analysis")
+        decode = Gst.ElementFactory.make("uridecodebin", None)
+        decode.set_property("uri", self.uri)
+        convert = Gst.ElementFactory.make("audioconvert", None)
+        analysis = AnalysisBin(self.preset)
+        analysis.set_interval(self.interval)
+        sink = Gst.ElementFactory.make("fakesink", None)
+        # decode as fast as possible
+        sink.set_property("sync", False)
+
+        for element in (decode, convert, analysis, sink):
+            pipeline.add(element)
+        convert.link(analysis)
+        analysis.link(sink)
+
+        def on_pad_added(element, pad):
+            caps = pad.get_current_caps() or pad.query_caps(None)
+            sink_pad = convert.get_static_pad("sink")
+            if caps.get_structure(0).get_name().startswith("audio/") and \
+                    not sink_pad.is_linked():
+                pad.link(sink_pad)
+
+        decode.connect('pad-added', on_pad_added)
+
+        self.pipeline = pipeline
+        self._watch(pipeline, self._encode)
+        pipeline.set_state(Gst.State.PLAYING)
+
+    def _encode(self):
+        self._stop_pipeline()
+        print("spectrum export: %d frames analysed in %.1f s" %
+              (len(self.frames), time.monotonic() - self.start_time))
+
+        if not self.layout.bands:
+            self._finish("%dx%d is too small to draw any bars" %
+                         (self.width, self.height))
+            return
+
+        self.pool = ThreadPoolExecutor(os.cpu_count() or 1)
+
+        if '%' in self.output:
+            self._start_rendering()
+            return
+
+        encoder = ENCODERS.get(os.path.splitext(self.output)[1].lower(),
+                               DEFAULT_ENCODER)
+        try:
+            pipeline = Gst.parse_launch(
+                "appsrc name=source format=time "
+                "caps=video/x-raw,format=BGRx,width=%d,height=%d,framerate=%d/1 ! "
+                "videoconvert ! %s ! filesink name=sink" %
+                (self.width, self.height, self.fps, encoder))
+        except GLib.Error as e:
+            self._finish(e.message)
+            return
+
+        pipeline.get_by_name("sink").set_property("location", self.output)
+        self.appsrc = pipeline.get_by_name("source")
+        self.appsrc.set_property("max-bytes", self.BATCH * 4 * self.width * self.height)
+        self.appsrc.connect('need-data', self.on_need_data)
+        self.appsrc.connect('enough-data', self.on_enough_data)
+
+        self.pipeline = pipeline
+        self._watch(pipeline, self._finish)
+        pipeline.set_state(Gst.State.PLAYING)
+        self._start_rendering()
+
+    def on_need_data(self, appsrc, length):
+        # streaming thread
+        self.wanted = True
+        GLib.idle_add(self._start_rendering)
+
+    def on_enough_data(self, appsrc):
+        # streaming thread
+        self.wanted = False
+
+    def _start_rendering(self):
+        if not self.render_id and self.pool:
+            self.render_id = GLib.idle_add(self.render_batch)
+
+        return False
+
+    def _frame_state(self, index):
+        # peaks depend on every frame before, so this part is sequential
+        frame = self.frames[index]
+        bands = len(self.band_ranges) if self.band_ranges else len(frame)
+        data = scale_bands(frame, self.band_ranges, self.height_scale,
+                           array('d', bytes(bands * 8)))
+        raise_peaks(self.peaks, data, self.layout.bands)
+
+        decay_frames = max(int(round(PEAK_DECAY_INTERVAL / 1000.0 * self.fps)), 1)
+        if index % decay_frames == 0:
+            lower_peaks(self.peaks, self.threshold * self.height_scale,
+                        self.layout.bands)
+
+        return data, array('d', self.peaks)
+
+    def _draw(self, index, data, peaks):
+        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, self.width, self.height)
+        cr = cairo.Context(surface)
+        cr.set_source_rgb(0, 0, 0)
+        cr.paint()
+        end = min(self.layout.bands, len(data), len(peaks))
+        self.bars.draw(cr, data, peaks, FIRST_BAND, end, self.palette.alpha)
+        surface.flush()
+
+        if self.appsrc:
+            return bytes(surface.get_data())
+
+        surface.write_to_png(self.output % index)
+        return None
+
+    def render_batch(self):
+        if not self.wanted and self.appsrc:
+            # the encoder has enough queued - need-data restarts rendering
+            self.render_id = None
+            return False
+
+        first = self.rendered
+        last = min(first + self.BATCH, len(self.frames))
+        states = [self._frame_state(index) for index in range(first, last)]
+
+        if not self.bars:
+            # created once, before the threads share it
+            surface = cairo.ImageSurface(cairo.FORMAT_RGB24, self.width, self.height)
+            self.bars = BarRenderer(cairo.Context(surface), self.layout,
+                                    self.palette, self.height)
+
+        images = self.pool.map(lambda job: self._draw(*job),
+                               [(index, data, peaks) for index, (data, peaks)
+                                in zip(range(first, last), states)])
+
+        frame_duration = Gst.SECOND // self.fps
+        for index, image in zip(range(first, last), images):
+            if self.appsrc:
+                buf = Gst.Buffer.new_wrapped(image)
+                buf.pts = index * Gst.SECOND // self.fps
+                buf.duration = frame_duration
+                self.appsrc.emit('push-buffer', buf)
+            self.rendered += 1
+
+        if self.rendered < len(self.frames):
+            return True
+
+        self.render_id = None
+        if self.appsrc:
+            # the pipeline's EOS finishes the export
+            self.appsrc.emit('end-of-stream')
+        else:
+            self._finish()
+
+        return False
+
+    def _stop_pipeline(self):
+        if self.pipeline:
+            bus = self.pipeline.get_bus()
+            bus.remove_signal_watch()
+            self.pipeline.set_state(Gst.State.NULL)
+            self.pipeline = None
+
+    def _finish(self, error=None):
+        if self.render_id:
+            GLib.source_remove(self.render_id)
+            self.render_id = None
+
+        self._stop_pipeline()
+        self.appsrc = None
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+
+        self.error = error
+        if error:
+            print("spectrum export failed: %s" % error)
+        else:
+            print("spectrum export: %d frames (%.1f s) at %.1fx real time" %
+                  (self.rendered, self.duration, self.speed))
+
+        if self.on_done:
+            self.on_done(self)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="render the spectrum of an audio file to a video")
+    parser.add_argument('input', help="audio file")
+    parser.add_argument('output', help="video file, or a PNG name pattern such as frame-%%05d.png")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--palette', default=DEFAULT_PALETTE)
+    parser.add_argument('--preset', default=DEFAULT_PRESET, choices=sorted(PRESETS))
+    args = parser.parse_args()
+
+    from spectrum_palette import Palette
+
+    Gst.init(None)
+    loop = GLib.MainLoop()
+    exporter = SpectrumExporter(Gst.filename_to_uri(args.input), args.output,
+                                args.width, args.height, args.fps,
+                                Palette.from_string(args.palette), args.preset,
+                                on_done=lambda exporter: loop.quit())
+    exporter.start()
+    loop.run()
+
+    return 1 if exporter.error else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,350 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# spectral fingerprints - every track played is summarised as the mean and
+# standard deviation of its spectrum in a few logarithmic bands. The
+# summaries are kept in an on-disk index keyed by the RhythmDB location so
+# that sonically similar tracks can be looked up.
+#
+# The index is two files in the same order: 'vectors' holds fixed size
+# float32 records and 'locations' one location per line. Each record starts
+# with the band count and sample rate of the frames summarised - the log
+# bands, and the levels within them, differ between analysis presets and
+# with downmixing, so only records of the same format are compared.
+
+from array import array
+import heapq
+import math
+import os
+
+from gi.repository import RB
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LOG_BANDS = 16
+# mean and standard deviation per log band
+VECTOR_SIZE = LOG_BANDS * 2
+# band count and sample rate, then the vector
+FORMAT_SIZE = 2
+RECORD_SIZE = FORMAT_SIZE + VECTOR_SIZE
+RECORD_BYTES = RECORD_SIZE * array('f').itemsize
+# records without a format were written to the parent directory
+INDEX_VERSION = 2
+
+# seconds of a track that must be heard before it is summarised
+MIN_SECONDS = 10.0
+
+
+def log_band_edges(bands, log_bands=LOG_BANDS):
+    '''
+    returns log_bands + 1 edges grouping the analyser bands logarithmically;
+    band 0 (DC) is left out and every group has at least one band
+    '''
+    edges = [1]
+    for k in range(1, log_bands + 1):
+        edge = int(round(bands ** (k / float(log_bands))))
+        edges.append(min(max(edge, edges[-1] + 1), bands))
+
+    return edges
+
+
+class TrackSummary(object):
+    '''
+    running (Welford) mean and variance of each log band over a track
+
+    :param bands: `int` bands in each frame
+    :param rate: `int` sample rate the frames were analysed at
+    '''
+
+    def __init__(self, bands, rate):
+        edges = log_band_edges(bands)
+        self.groups = list(zip(edges[:-1], edges[1:]))
+        self.bands = bands
+        self.rate = rate
+        self.count = 0
+        # seconds of audio the frames added cover
+        self.seconds = 0.0
+        self.mean = [0.0] * len(self.groups)
+        self.m2 = [0.0] * len(self.groups)
+
+    def add(self, magnitude_list, interval):
+        '''
+        adds a frame covering `interval` seconds; frames must have the band
+        count the summary was created with
+        '''
+        if len(magnitude_list) != self.bands:
+            return
+
+        self.count += 1
+        self.seconds += interval
+        count = self.count
+        mean = self.mean
+        m2 = self.m2
+        for i, (start, end) in enumerate(self.groups):
+            value = math.fsum(magnitude_list[start:end]) / (end - start)
+            delta = value - mean[i]
+            mean[i] += delta / count
+            m2[i] += delta * (value - mean[i])
+
+    @property
+    def format(self):
+        return (self.bands, self.rate)
+
+    def vector(self):
+        deviations = [math.sqrt(m2 / self.count) if self.count else 0.0
+                      for m2 in self.m2]
+        return self.mean + deviations
+
+
+class FingerprintIndex(object):
+    '''
+    on-disk index of track summaries with nearest neighbour lookup
+    '''
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(RB.user_data_dir(), 'spectrum-fingerprints',
+                                         'v%d' % INDEX_VERSION)
+        self.vectors_path = os.path.join(self.path, 'vectors')
+        self.locations_path = os.path.join(self.path, 'locations')
+
+        self.vectors = array('f')
+        self.locations = []
+        self.positions = {}
+
+        self.load()
+
+    def __len__(self):
+        return len(self.locations)
+
+    def load(self):
+        self.vectors = array('f')
+        self.locations = []
+
+        text = ''
+        if os.path.exists(self.locations_path):
+            with open(self.locations_path, encoding='utf-8') as f:
+                text = f.read()
+            self.locations = text.splitlines()
+            if text and not text.endswith('\n'):
+                # the last location was only partly written
+                del self.locations[-1]
+
+        data = b''
+        if os.path.exists(self.vectors_path):
+            with open(self.vectors_path, 'rb') as f:
+                data = f.read()
+
+        # ignore any partly written record
+        count = min(len(data) // RECORD_BYTES, len(self.locations))
+        self.vectors.frombytes(data[:count * RECORD_BYTES])
+        del self.locations[count:]
+        self._truncate(count, len(data), text)
+
+        self.positions = dict((location, i) for i, location in enumerate(self.locations))
+
+    def _truncate(self, count, vectors_size, text):
+        '''
+        cuts both files back to the first count records so that the next
+        add() appends in step
+        '''
+        if vectors_size != count * RECORD_BYTES:
+            os.truncate(self.vectors_path, count * RECORD_BYTES)
+
+        locations = ''.join(location + '\n' for location in self.locations)
+        if text != locations:
+            temp_path = self.locations_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(locations)
+            os.replace(temp_path, self.locations_path)
+
+    def add(self, location, vector, format):
+        '''
+        stores (or replaces) the summary for location, writing it straight
+        to disk
+
+        :param format: (bands, rate) of the frames summarised
+        '''
+        record = array('f', list(format) + list(vector))
+        if len(record) != RECORD_SIZE:
+            return
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        position = self.positions.get(location)
+        if position is None:
+            position = len(self.locations)
+            self.positions[location] = position
+            self.locations.append(location)
+            self.vectors.extend(record)
+
+            with open(self.vectors_path, 'ab') as f:
+                f.write(record.tobytes())
+            with open(self.locations_path, 'a', encoding='utf-8') as f:
+                f.write(location + '\n')
+        else:
+            start = position * RECORD_SIZE
+            self.vectors[start:start + RECORD_SIZE] = record
+
+            with open(self.vectors_path, 'r+b') as f:
+                f.seek(position * RECORD_BYTES)
+                f.write(record.tobytes())
+
+    def _record(self, location):
+        position = self.positions.get(location)
+        if position is None:
+            return None
+
+        start = position * RECORD_SIZE
+        return list(self.vectors[start:start + RECORD_SIZE])
+
+    def vector(self, location):
+        record = self._record(location)
+        return record[FORMAT_SIZE:] if record else None
+
+    def format(self, location):
+        '''
+        returns the (bands, rate) location was summarised at
+        '''
+        record = self._record(location)
+        return (int(record[0]), int(record[1])) if record else None
+
+    def nearest(self, location, count=10):
+        '''
+        returns up to count (distance, location) pairs for the tracks that
+        sound most like location, closest first. Only tracks summarised in
+        the same format as location are compared
+        '''
+        record = self._record(location)
+        if record is None:
+            return []
+
+        # one more than asked for - the track itself is always nearest
+        if numpy is not None:
+            best = self._numpy_nearest(record, count + 1)
+        else:
+            best = heapq.nsmallest(count + 1, zip(self._distances(record),
+                                                  range(len(self.locations))))
+
+        return [(math.sqrt(distance), self.locations[position])
+                for distance, position in best
+                if distance != float('inf') and
+                self.locations[position] != location][:count]
+
+    def _numpy_nearest(self, target, count):
+        records = numpy.frombuffer(self.vectors, dtype=numpy.float32)
+        records = records.reshape(-1, RECORD_SIZE)
+        target = numpy.asarray(target, dtype=numpy.float32)
+        difference = records[:, FORMAT_SIZE:] - target[FORMAT_SIZE:]
+        distances = numpy.einsum('ij,ij->i', difference, difference)
+        same_format = numpy.all(records[:, :FORMAT_SIZE] == target[:FORMAT_SIZE],
+                                axis=1)
+        distances[~same_format] = numpy.inf
+
+        if count < len(distances):
+            positions = numpy.argpartition(distances, count)[:count]
+        else:
+            positions = numpy.arange(len(distances))
+        positions = positions[numpy.argsort(distances[positions])]
+
+        return [(float(distances[i]), int(i)) for i in positions]
+
+    def _distances(self, target):
+        vectors = self.vectors
+        format = target[:FORMAT_SIZE]
+        distances = []
+        for start in range(0, len(vectors), RECORD_SIZE):
+            record = vectors[start:start + RECORD_SIZE]
+            if list(record[:FORMAT_SIZE]) != format:
+                distances.append(float('inf'))
+                continue
+            distances.append(sum((a - b) * (a - b)
+                                 for a, b in zip(record[FORMAT_SIZE:],
+                                                 target[FORMAT_SIZE:])))
+
+        return distances
+
+
+class FingerprintRecorder(object):
+    '''
+    summarises each playing track from the analyser frames and adds it to
+    the index when the song changes
+    '''
+
+    def __init__(self, shell, analyser, index=None):
+        self.shell = shell
+        self.analyser = analyser
+        self.index = index or FingerprintIndex()
+
+        self.location = None
+        self.summary = None
+
+        shell_player = shell.props.shell_player
+        self.song_id = shell_player.connect('playing-song-changed',
+                                            self.on_playing_song_changed)
+        self._start_track(shell_player.get_playing_entry())
+
+        self.analyser.start()
+        self.subscriber = self.analyser.subscribe(every_frame=self.on_frame)
+
+    def cleanup(self):
+        self._commit()
+        self.analyser.unsubscribe(self.subscriber)
+        self.shell.props.shell_player.disconnect(self.song_id)
+
+    def _start_track(self, entry):
+        if entry:
+            self.location = entry.get_string(RB.RhythmDBPropType.LOCATION)
+        else:
+            self.location = None
+        self.summary = None
+
+    def _commit(self):
+        if self.location and self.summary and self.summary.seconds >= MIN_SECONDS:
+            self.index.add(self.location, self.summary.vector(),
+                           self.summary.format)
+
+    def similar(self, count=10):
+        '''
+        returns up to count (distance, location) pairs for the tracks that
+        sound most like the playing one, closest first
+        '''
+        if not self.location:
+            return []
+
+        # the playing track is added once enough of it has been heard
+        self._commit()
+        return self.index.nearest(self.location, count)
+
+    def on_playing_song_changed(self, shell_player, entry):
+        self._commit()
+        self._start_track(entry)
+
+    def on_frame(self, magnitude_list):
+        rate = self.analyser.rate
+        if not self.location or not rate:
+            return
+
+        if not self.summary or self.summary.format != (len(magnitude_list), rate):
+            # a new analysis preset or downmixing changed the format - the
+            # track is summarised again from here
+            self.summary = TrackSummary(len(magnitude_list), rate)
+        self.summary.add(magnitude_list, self.analyser.interval)
@@ -0,0 +1,281 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# OpenGL view for the spectrum analyser. All bars and peak markers are
+# drawn with a single instanced draw call; the band levels for a frame are
+# uploaded as one uniform array. The palette is a lookup texture, uploaded
+# only when it or the band count changes.
+
+import ctypes
+import time
+
+from gi.repository import Gtk
+from gi.repository import GLib
+
+try:
+    from OpenGL import GL
+    from OpenGL.GL import shaders
+except ImportError:
+    GL = None
+
+# must match the size of the levels[] uniform array below
+MAX_GL_BANDS = 64
+# rows of the palette lookup texture, from the top of the view to the bottom
+PALETTE_ROWS = 64
+
+VERTEX_SHADER = """
+#version 150
+
+uniform vec2 levels[%d];
+uniform vec2 viewport;
+uniform float start;
+uniform float stride;
+uniform float band_width;
+uniform float bottom;
+uniform float first;
+
+out float v_pos;
+out float v_level;
+flat out int v_peak;
+flat out float v_band;
+
+const vec2 corners[6] = vec2[](vec2(0.0, 0.0), vec2(1.0, 0.0), vec2(0.0, 1.0),
+                               vec2(1.0, 0.0), vec2(1.0, 1.0), vec2(0.0, 1.0));
+
+void main()
+{
+    // vertices 0-5 are the peak marker, 6-11 the bar itself
+    vec2 corner = corners[gl_VertexID %% 6];
+    vec2 level = levels[gl_InstanceID];
+    float top;
+    float base;
+
+    if (gl_VertexID < 6) {
+        v_peak = 1;
+        top = -level.y - 0.75;
+        base = -level.y + 0.75;
+    } else {
+        v_peak = 0;
+        top = -level.x;
+        base = bottom;
+    }
+
+    float x = start + float(gl_InstanceID) * stride + corner.x * band_width;
+    float y = mix(top, base, corner.y);
+
+    v_pos = corner.y;
+    v_level = y / bottom;
+    v_band = first + float(gl_InstanceID);
+    gl_Position = vec4(x / viewport.x * 2.0 - 1.0,
+                       1.0 - y / viewport.y * 2.0, 0.0, 1.0);
+}
+""" % MAX_GL_BANDS
+
+FRAGMENT_SHADER = """
+#version 150
+
+uniform sampler2D palette;
+uniform float bands;
+uniform int by_level;
+uniform vec3 peak;
+uniform float alpha;
+
+in float v_pos;
+in float v_level;
+flat in int v_peak;
+flat in float v_band;
+
+out vec4 colour;
+
+void main()
+{
+    vec3 rgb;
+
+    if (v_peak == 1) {
+        rgb = peak;
+    } else {
+        float pos = by_level == 1 ? v_level : v_pos;
+        rgb = texture(palette, vec2((v_band + 0.5) / bands, pos)).rgb;
+    }
+
+    colour = vec4(rgb, alpha);
+}
+"""
+
+
+def gl_available():
+    '''
+    returns True if PyOpenGL could be imported
+    '''
+    return GL is not None
+
+
+class SpectrumGLArea(Gtk.GLArea):
+    '''
+    displays the frames held by a SpectrumPlayer using OpenGL. If a context
+    cannot be created the player is switched back to its cairo view.
+    '''
+
+    def __init__(self, source):
+        super(SpectrumGLArea, self).__init__()
+
+        self.source = source
+        self.program = None
+        self.vao = None
+        self.uniforms = {}
+        self.texture = None
+        # (palette, bands) held by the texture
+        self.palette_key = None
+        # level/peak pairs for every band - reused for every frame
+        self.levels = (ctypes.c_float * (MAX_GL_BANDS * 2))()
+
+        self.set_required_version(3, 2)
+        self.props.hexpand = True
+
+        self.connect("realize", self.on_realize)
+        self.connect("unrealize", self.on_unrealize)
+        self.connect("resize", self.on_resize)
+        self.connect("render", self.on_render)
+        self.connect("notify::scale-factor", source.on_scale_factor_changed)
+        self.connect("map", source.on_view_map)
+        self.connect("unmap", source.on_view_unmap)
+
+    def on_realize(self, widget):
+        self.make_current()
+        if self.get_error():
+            print("unable to create an OpenGL context: %s" % self.get_error())
+            GLib.idle_add(self._fall_back)
+            return
+
+        try:
+            self.vao = GL.glGenVertexArrays(1)
+            GL.glBindVertexArray(self.vao)
+            self.program = shaders.compileProgram(
+                shaders.compileShader(VERTEX_SHADER, GL.GL_VERTEX_SHADER),
+                shaders.compileShader(FRAGMENT_SHADER, GL.GL_FRAGMENT_SHADER))
+        except Exception as e:
+            print("unable to compile the spectrum shaders: %s" % e)
+            self.program = None
+            GLib.idle_add(self._fall_back)
+            return
+
+        for name in ('levels', 'viewport', 'start', 'stride', 'band_width',
+                     'bottom', 'first', 'palette', 'bands', 'by_level', 'peak',
+                     'alpha'):
+            self.uniforms[name] = GL.glGetUniformLocation(self.program, name)
+
+        self.texture = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+        for parameter, value in ((GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR),
+                                 (GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR),
+                                 (GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE),
+                                 (GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)):
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, parameter, value)
+        self.palette_key = None
+
+        GL.glUseProgram(self.program)
+        GL.glUniform1i(self.uniforms['palette'], 0)
+
+    def on_unrealize(self, widget):
+        self.make_current()
+        if self.get_error():
+            return
+
+        if self.program:
+            GL.glDeleteProgram(self.program)
+            self.program = None
+
+        if self.texture:
+            GL.glDeleteTextures([self.texture])
+            self.texture = None
+
+        if self.vao:
+            GL.glDeleteVertexArrays(1, [self.vao])
+            self.vao = None
+
+    def _fall_back(self):
+        if self.source.view is self:
+            self.source.set_renderer('cairo')
+
+        return False
+
+    def _upload_palette(self, palette, bands):
+        lut = palette.lut(bands, PALETTE_ROWS)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGB8, bands, PALETTE_ROWS, 0,
+                        GL.GL_RGB, GL.GL_UNSIGNED_BYTE, lut.tobytes())
+
+        GL.glUniform1f(self.uniforms['bands'], bands)
+        GL.glUniform1i(self.uniforms['by_level'], int(palette.by_level))
+        GL.glUniform3f(self.uniforms['peak'], *palette.peak)
+        self.palette_key = (palette, bands)
+
+    def on_resize(self, widget, width, height):
+        # GtkGLArea reports the size in device pixels; the band geometry is
+        # calculated in logical pixels like the cairo view
+        self.source.resize(self.get_allocated_width(),
+                           self.get_allocated_height())
+
+    def on_render(self, area, context):
+        context = self.get_toplevel().get_style_context()
+        bg_colour = context.get_background_color(Gtk.StateFlags.NORMAL)
+        GL.glClearColor(bg_colour.red, bg_colour.green, bg_colour.blue, 1.0)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+
+        source = self.source
+        data = source.spect_data
+        layout = source.layout
+        if not data or not layout or not self.program:
+            return True
+
+        # the bottom two bands and any scrolled out of view are skipped, as
+        # with the cairo view
+        bands = min(layout.bands, len(data), len(source.max_magnitude))
+        first, end = source.visible_bands(bands)
+        count = min(end - first, MAX_GL_BANDS)
+        if count <= 0:
+            return True
+
+        levels = self.levels
+        levels[0:count * 2:2] = data[first:first + count]
+        levels[1:count * 2:2] = source.max_magnitude[first:first + count]
+
+        GL.glEnable(GL.GL_BLEND)
+        GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
+
+        GL.glUseProgram(self.program)
+        GL.glBindVertexArray(self.vao)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)
+        if self.palette_key != (source.palette, bands):
+            self._upload_palette(source.palette, bands)
+        GL.glUniform2fv(self.uniforms['levels'], count, levels)
+        GL.glUniform2f(self.uniforms['viewport'],
+                       self.get_allocated_width(), self.get_allocated_height())
+        GL.glUniform1f(self.uniforms['start'], layout.x[first])
+        GL.glUniform1f(self.uniforms['stride'], layout.stride)
+        GL.glUniform1f(self.uniforms['band_width'], layout.band_width)
+        GL.glUniform1f(self.uniforms['bottom'], source.spect_height)
+        GL.glUniform1f(self.uniforms['first'], first)
+        GL.glUniform1f(self.uniforms['alpha'], source.bar_alpha())
+
+        start = time.perf_counter()
+        GL.glDrawArraysInstanced(GL.GL_TRIANGLES, 0, 12, count)
+        source.frame_drawn(time.perf_counter() - start)
+
+        return True
@@ -0,0 +1,108 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+import time
+
+
+class QualityGovernor(object):
+    '''
+    watches how long frames take to draw and how late the main loop runs
+    the frame updates, and steps the drawing quality down when either is
+    over budget - and back up again once there is headroom.
+
+    :param on_change: function called with the new tier
+    :param frame_budget: `float` seconds a frame may take to draw
+    :param latency_budget: `float` seconds a frame update may wait in the
+      main loop
+    '''
+
+    # quality tiers - each one includes the savings of those before it
+    FULL = 0
+    NO_ALPHA_GROUPS = 1
+    HALF_BANDS = 2
+    LOW_FPS = 3
+
+    TIER_NAMES = ('full', 'no alpha groups', 'half bands', 'low fps')
+
+    # seconds a budget has to be exceeded before dropping a tier, and to
+    # have been comfortably met before restoring one
+    DOWNGRADE_AFTER = 1.0
+    UPGRADE_AFTER = 5.0
+
+    def __init__(self, on_change=None, frame_budget=0.008, latency_budget=0.05):
+        self.on_change = on_change
+        self.frame_budget = frame_budget
+        self.latency_budget = latency_budget
+
+        self.tier = QualityGovernor.FULL
+        self.frame_time = 0.0
+        self.latency = 0.0
+        self.over_since = None
+        self.under_since = None
+
+    @property
+    def tier_name(self):
+        return QualityGovernor.TIER_NAMES[self.tier]
+
+    def reset(self):
+        self.frame_time = 0.0
+        self.latency = 0.0
+        self.over_since = None
+        self.under_since = None
+        self._set_tier(QualityGovernor.FULL)
+
+    def frame_drawn(self, seconds):
+        self.frame_time += (seconds - self.frame_time) * 0.1
+        self._evaluate()
+
+    def frame_delayed(self, seconds):
+        self.latency += (seconds - self.latency) * 0.1
+        self._evaluate()
+
+    def _evaluate(self):
+        now = time.monotonic()
+
+        if self.frame_time > self.frame_budget or self.latency > self.latency_budget:
+            self.under_since = None
+            if self.over_since is None:
+                self.over_since = now
+            elif now - self.over_since > QualityGovernor.DOWNGRADE_AFTER and \
+                    self.tier < QualityGovernor.LOW_FPS:
+                self.over_since = None
+                self._set_tier(self.tier + 1)
+        elif self.frame_time < self.frame_budget / 2 and \
+                self.latency < self.latency_budget / 2:
+            self.over_since = None
+            if self.under_since is None:
+                self.under_since = now
+            elif now - self.under_since > QualityGovernor.UPGRADE_AFTER and \
+                    self.tier > QualityGovernor.FULL:
+                self.under_since = None
+                self._set_tier(self.tier - 1)
+        else:
+            self.over_since = None
+            self.under_since = None
+
+    def _set_tier(self, tier):
+        if tier == self.tier:
+            return
+
+        print("spectrum quality: %s" % QualityGovernor.TIER_NAMES[tier])
+        self.tier = tier
+        if self.on_change:
+            self.on_change(tier)
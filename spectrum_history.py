@@ -0,0 +1,157 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# rolling history of the analysed frames - the last few minutes kept in a
+# fixed size ring of bytes, so that a span of the track can be looked up
+# by stream position without decoding it again.
+#
+# Each band magnitude is quantised to one byte between the analyser's
+# threshold and 0 dB - about a quarter of a dB per step for the default
+# -60 dB threshold.
+
+from array import array
+
+
+class SpectralHistory(object):
+    '''
+    ring buffer of quantised frames and their stream times
+
+    :param bands: `int` bands per frame
+    :param interval: `float` seconds between frames
+    :param seconds: `float` length of history kept
+    :param floor: `float` dB stored as 0
+    '''
+
+    def __init__(self, bands, interval=0.1, seconds=300, floor=-60):
+        self.seconds = seconds
+        self.floor = float(floor)
+        self.reset(bands, interval)
+
+    def reset(self, bands, interval):
+        '''
+        empties the history and sizes it for a new frame format
+        '''
+        self.bands = bands
+        self.interval = interval
+        self.capacity = max(int(self.seconds / interval), 1)
+
+        self.levels = array('B', bytes(self.capacity * bands))
+        self.times = array('q', bytes(self.capacity * array('q').itemsize))
+        # physical index of the oldest frame
+        self.first = 0
+        self.count = 0
+
+    def clear(self):
+        self.first = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        '''
+        memory used by the stored frames
+        '''
+        return len(self.levels) * self.levels.itemsize + \
+            len(self.times) * self.times.itemsize
+
+    @property
+    def duration(self):
+        '''
+        seconds of stream held
+        '''
+        if not self.count:
+            return 0.0
+
+        return (self._time(self.count - 1) - self._time(0)) / 1e9 + self.interval
+
+    def append(self, magnitude_list, stream_time):
+        '''
+        adds a frame of band magnitudes (dB) at stream_time (ns), replacing
+        the oldest frame once the history is full
+        '''
+        if len(magnitude_list) != self.bands:
+            self.reset(len(magnitude_list), self.interval)
+
+        if self.count and stream_time < self._time(self.count - 1):
+            # a seek or a new track - positions before now no longer apply
+            self.clear()
+
+        if self.count < self.capacity:
+            slot = (self.first + self.count) % self.capacity
+            self.count += 1
+        else:
+            slot = self.first
+            self.first = (self.first + 1) % self.capacity
+
+        self.times[slot] = stream_time
+
+        floor = self.floor
+        scale = 255.0 / -floor
+        levels = self.levels
+        offset = slot * self.bands
+        for i, value in enumerate(magnitude_list):
+            level = int((value - floor) * scale + 0.5)
+            levels[offset + i] = 0 if level < 0 else 255 if level > 255 else level
+
+    def _slot(self, index):
+        return (self.first + index) % self.capacity
+
+    def _time(self, index):
+        return self.times[self._slot(index)]
+
+    def frame(self, index):
+        '''
+        returns frame index (0 the oldest) in dB
+        '''
+        offset = self._slot(index) * self.bands
+        step = -self.floor / 255.0
+        floor = self.floor
+        return array('d', [floor + level * step
+                           for level in self.levels[offset:offset + self.bands]])
+
+    def latest(self):
+        '''
+        returns the newest frame in dB, or None
+        '''
+        if not self.count:
+            return None
+
+        return self.frame(self.count - 1)
+
+    def _bisect(self, stream_time):
+        # first index whose time is not before stream_time
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._time(middle) < stream_time:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def between(self, start, end):
+        '''
+        yields the (stream time, frame) pairs from start up to end (ns)
+        '''
+        index = self._bisect(start)
+        while index < self.count and self._time(index) <= end:
+            yield self._time(index), self.frame(index)
+            index += 1
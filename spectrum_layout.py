@@ -0,0 +1,162 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# bar geometry of a spectrum view - calculated once whenever the view's
+# size changes and used by every renderer (cairo, OpenGL and the offline
+# exporter) rather than each working it out for every frame - and the
+# grouping and scaling of the analysed bands into those bars. Pure python,
+# so that it can be used without a display.
+
+from array import array
+import math
+
+# x position of the first bar drawn
+BAR_START = 5
+# the bottom bands are never drawn
+FIRST_BAND = 2
+
+# most bars shown - finer analysis is grouped down to this
+DISPLAY_BANDS = 64
+
+# milliseconds between each 1 pixel fall of the peak markers
+PEAK_DECAY_INTERVAL = 400
+
+
+class BandLayout(object):
+    '''
+    positions of the bars for a view size. The bars drawn always fit
+    within the width: as many bands as possible up to max_bands are shown,
+    widened to fill the view, and when even min_band_width bars do not fit
+    fewer bands are shown.
+
+    :param width: `int` view width in logical pixels
+    :param height: `int` view height in logical pixels
+    :param max_bands: `int` most bands shown
+    :param min_band_width: `float` narrowest bar
+    :param band_interval: `float` gap between bars
+    :param scale: `int` device pixels per logical pixel - bar widths are
+      whole device pixels so that their edges stay sharp
+    '''
+
+    def __init__(self, width, height, max_bands, min_band_width=4,
+                 band_interval=3, scale=1):
+        self.width = width
+        self.height = height
+        self.scale = scale
+
+        # n bars and the n - 1 gaps between them fill the width from
+        # BAR_START; the first FIRST_BAND bands take no space
+        available = width - BAR_START + band_interval
+        drawn = max(max_bands - FIRST_BAND, 1)
+        band_width = available / float(drawn) - band_interval
+        if band_width < min_band_width:
+            band_width = min_band_width
+            drawn = int(available / (band_width + band_interval))
+            bands = drawn + FIRST_BAND if drawn > 0 else 0
+        else:
+            bands = max_bands
+
+        self.bands = bands
+        self.band_width = max(math.floor(band_width * scale) / scale, 1.0 / scale)
+        self.band_interval = band_interval
+        self.stride = self.band_width + band_interval
+
+        # left edge of each bar
+        self.x = array('d', [BAR_START + (i - FIRST_BAND) * self.stride
+                             for i in range(bands)])
+
+    def visible(self, left, right, bands=None):
+        '''
+        returns the (first, end) range of bands drawn at least partly
+        between left and right, limited to the first `bands`
+        '''
+        end = self.bands if bands is None else min(bands, self.bands)
+        first = max(FIRST_BAND,
+                    int((left - BAR_START - self.band_width) / self.stride) + FIRST_BAND)
+        end = min(end, int((right - BAR_START) / self.stride) + FIRST_BAND + 1)
+
+        return first, end
+
+
+def natural_width(max_bands, min_band_width=4, band_interval=3):
+    '''
+    returns the narrowest view width (logical pixels) in which a BandLayout
+    shows all max_bands bands
+    '''
+    drawn = max_bands - FIRST_BAND
+    if drawn <= 0:
+        return BAR_START
+
+    return int(math.ceil(BAR_START + drawn * (min_band_width + band_interval)
+                         - band_interval))
+
+
+def group_ranges(analysed_bands, bands):
+    '''
+    returns the (start, end) analysed bands merged into each of `bands`
+    displayed bands, or None when every analysed band is shown
+    '''
+    if not bands or bands >= analysed_bands:
+        return None
+
+    edges = [i * analysed_bands // bands for i in range(bands + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def scale_bands(magnitude_list, ranges, scale, spect):
+    '''
+    writes the frame scaled to the display height into spect, an array
+    with (at least) one item per displayed band
+    '''
+    if ranges:
+        # fewer bands displayed than analysed - show the loudest of each
+        # group. Indexed rather than sliced, so no list is allocated per band
+        for i, (start, end) in enumerate(ranges):
+            loudest = magnitude_list[start]
+            for j in range(start + 1, end):
+                if magnitude_list[j] > loudest:
+                    loudest = magnitude_list[j]
+            spect[i] = loudest * scale
+    else:
+        for i in range(min(len(spect), len(magnitude_list))):
+            spect[i] = magnitude_list[i] * scale
+
+    return spect
+
+
+def raise_peaks(peaks, spect, bands):
+    '''
+    lifts the peak markers to any of the first `bands` bars above them
+    '''
+    for i in range(min(bands, len(spect), len(peaks))):
+        if spect[i] > peaks[i]:
+            peaks[i] = spect[i]
+
+
+def lower_peaks(peaks, floor, bands):
+    '''
+    lowers the peak markers one step; returns True if any are still above
+    the floor
+    '''
+    decaying = False
+    for i in range(min(bands, len(peaks))):
+        if peaks[i] > floor:
+            peaks[i] -= 1
+            decaying = True
+
+    return decaying
@@ -0,0 +1,198 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# EBU R128 style loudness metering from the frames already produced by the
+# analyser - no extra decode or sample processing in python.
+#
+# The K-weighting filter of ITU-R BS.1770 is applied in the frequency
+# domain: each spectrum band's power is weighted by the filter's gain at the
+# band's frequency. This is an approximation of the time domain filter.
+# Bands at the spectrum element's threshold carry no energy - the element
+# clamps quiet bands to it.
+#
+# The element's band powers are not mean squares of the signal: it keeps
+# one half of each FFT, divides by N^2 after a Hamming window and mixes the
+# channels down to one. The band energy is scaled back up by SPECTRUM_GAIN
+# and, as BS.1770 sums the power of each channel, by the channel count.
+#
+# RMS and peak levels come straight
+# from the GStreamer level element inserted alongside the spectrum element.
+
+from collections import deque
+import cmath
+import math
+
+# BS.1770 K-weighting biquads (pre-filter shelf and RLB high pass) at 48 kHz
+SHELF_B = (1.53512485958697, -2.69169618940638, 1.19839281085285)
+SHELF_A = (1.0, -1.69065929318241, 0.73248077421585)
+HIGHPASS_B = (1.0, -2.0, 1.0)
+HIGHPASS_A = (1.0, -1.99004745483398, 0.99007225036621)
+K_RATE = 48000.0
+
+MOMENTARY_WINDOW = 0.4
+SHORT_TERM_WINDOW = 3.0
+
+# returned when there is no signal
+SILENCE = -70.0
+
+# mean square of the spectrum element's Hamming window
+HAMMING_POWER = 0.53836 ** 2 + 0.46164 ** 2 / 2
+# the other half of the FFT, and the power the window took away
+SPECTRUM_GAIN = 2.0 / HAMMING_POWER
+
+
+def _biquad_power(b, a, freq):
+    z = cmath.exp(-2j * math.pi * freq / K_RATE)
+    num = b[0] + b[1] * z + b[2] * z * z
+    den = a[0] + a[1] * z + a[2] * z * z
+    return abs(num / den) ** 2
+
+
+def k_weighting_power(freq):
+    '''
+    returns the power gain of the K-weighting filter at `freq` Hz
+    '''
+    # the 48 kHz coefficients are only defined up to 24 kHz - the shelf is
+    # flat by then
+    freq = min(freq, K_RATE / 2 - 1)
+    return _biquad_power(SHELF_B, SHELF_A, freq) * \
+        _biquad_power(HIGHPASS_B, HIGHPASS_A, freq)
+
+
+class LoudnessMeter(object):
+    '''
+    streaming momentary (400 ms) and short-term (3 s) loudness plus RMS and
+    peak levels. Memory is bounded by the short-term window.
+
+    :param interval: `float` seconds between analysis frames
+    :param threshold: `float` dB the analyser clamps quiet bands to
+    '''
+
+    def __init__(self, interval=0.1, threshold=-60):
+        self.interval = interval
+        self.threshold = threshold
+        self.rate = 0
+        self.channels = 1
+        self.weights = []
+
+        short_term = max(int(round(SHORT_TERM_WINDOW / interval)), 1)
+        self.momentary_frames = max(int(round(MOMENTARY_WINDOW / interval)), 1)
+        # weighted mean square of each frame
+        self.energies = deque(maxlen=short_term)
+        self.short_term_total = 0.0
+
+        self.rms = SILENCE
+        self.peak = SILENCE
+        self.track_peak = SILENCE
+
+    def set_format(self, rate, bands, channels=1):
+        '''
+        recalculates the per band weights - called when the stream's sample
+        rate or channels or the analyser band count changes
+
+        :param rate: `int` sample rate reaching the spectrum element
+        :param bands: `int` bands in each frame
+        :param channels: `int` channels of the audio being played
+        '''
+        channels = max(channels, 1)
+        if rate == self.rate and bands == len(self.weights) and \
+                channels == self.channels:
+            return
+
+        self.rate = rate
+        self.channels = channels
+        # band i is FFT bin i of a 2 * (bands - 1) point FFT
+        gain = SPECTRUM_GAIN * channels
+        self.weights = [gain * k_weighting_power(rate * i / (2.0 * (bands - 1)))
+                        for i in range(bands)]
+        self.reset()
+
+    def reset(self):
+        self.energies.clear()
+        self.short_term_total = 0.0
+
+    def reset_track(self):
+        self.reset()
+        self.track_peak = SILENCE
+
+    def add_spectrum(self, magnitude_list):
+        '''
+        adds a spectrum frame (band magnitudes in dB)
+        '''
+        if len(magnitude_list) != len(self.weights):
+            return
+
+        threshold = self.threshold
+        energy = math.fsum(weight * 10.0 ** (magnitude / 10.0)
+                           for weight, magnitude in zip(self.weights, magnitude_list)
+                           if magnitude > threshold)
+
+        if len(self.energies) == self.energies.maxlen:
+            self.short_term_total -= self.energies[0]
+        self.energies.append(energy)
+        self.short_term_total += energy
+
+    def add_level(self, rms_list, peak_list):
+        '''
+        adds per channel RMS and peak levels (dB) from the level element
+        '''
+        if rms_list:
+            # channel powers are summed as BS.1770 does
+            power = sum(10.0 ** (rms / 10.0) for rms in rms_list)
+            self.rms = self._to_db(power / len(rms_list))
+        if peak_list:
+            self.peak = max(peak_list)
+            self.track_peak = max(self.track_peak, self.peak)
+
+    @staticmethod
+    def _to_db(power):
+        if power <= 0:
+            return SILENCE
+        return max(10.0 * math.log10(power), SILENCE)
+
+    @staticmethod
+    def _to_lufs(mean_square):
+        if mean_square <= 0:
+            return SILENCE
+        return max(-0.691 + 10.0 * math.log10(mean_square), SILENCE)
+
+    @property
+    def momentary(self):
+        count = min(self.momentary_frames, len(self.energies))
+        if not count:
+            return SILENCE
+
+        recent = list(self.energies)[-count:]
+        return self._to_lufs(math.fsum(recent) / count)
+
+    @property
+    def short_term(self):
+        if not self.energies:
+            return SILENCE
+
+        return self._to_lufs(self.short_term_total / len(self.energies))
+
+    def will_clip(self, volume):
+        '''
+        returns True if the loudest peak of the current track would clip
+        at the given linear volume
+        '''
+        if volume <= 0:
+            return False
+
+        return self.track_peak + 20.0 * math.log10(volume) >= 0.0
@@ -0,0 +1,138 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# onset (beat) detection from the spectrum frames already being displayed.
+#
+# The detection function is the spectral flux - the summed rise in level of
+# every band since the previous frame. An onset is reported when the flux
+# is well above its recent average, measured by running (exponentially
+# weighted) estimates of its mean and mean deviation. The only state per
+# band is the previous frame.
+
+from array import array
+
+
+class OnsetDetector(object):
+    '''
+    streaming spectral flux onset detector with an adaptive threshold
+
+    :param interval: `float` seconds between frames
+    :param sensitivity: `float` deviations above the mean flux needed for
+      an onset - lower reports more onsets
+    :param refractory: `float` minimum seconds between onsets
+    '''
+
+    # weight of each new frame in the running flux statistics - about a
+    # second and a half of history at 10 frames per second
+    ADAPT = 0.07
+    # flux (dB summed over the bands) below which nothing is reported
+    MIN_FLUX = 1.0
+
+    def __init__(self, interval=0.1, sensitivity=1.5, refractory=0.1):
+        self.interval = interval
+        self.sensitivity = sensitivity
+        self.refractory = refractory
+
+        self.previous = array('d')
+        self.mean = 0.0
+        self.deviation = 0.0
+        self.flux = 0.0
+
+        # stream time (seconds) of the last onset and the smoothed time
+        # between onsets
+        self.time = 0.0
+        self.last_onset = None
+        self.period = 0.0
+
+        self.onsets = 0
+
+    def reset(self):
+        del self.previous[:]
+        self.mean = 0.0
+        self.deviation = 0.0
+        self.flux = 0.0
+        self.time = 0.0
+        self.last_onset = None
+        self.period = 0.0
+
+    @property
+    def tempo(self):
+        '''
+        estimated beats per minute from the spacing of recent onsets; 0
+        when unknown
+        '''
+        if not self.period:
+            return 0.0
+
+        return 60.0 / self.period
+
+    def add(self, magnitude_list, stream_time=None):
+        '''
+        adds a frame of band magnitudes (dB); returns the onset strength -
+        how far the flux exceeded the threshold, relative to it - or 0.0
+
+        :param stream_time: `float` seconds into the stream of the frame;
+          if not given frames are assumed to be `interval` apart
+        '''
+        if stream_time is None:
+            self.time += self.interval
+        else:
+            if stream_time < self.time:
+                # a seek or a new track
+                self.last_onset = None
+            self.time = stream_time
+
+        previous = self.previous
+        if len(previous) != len(magnitude_list):
+            self.previous = array('d', magnitude_list)
+            return 0.0
+
+        # half wave rectified difference - only rising bands count
+        flux = 0.0
+        for i, value in enumerate(magnitude_list):
+            rise = value - previous[i]
+            if rise > 0.0:
+                flux += rise
+            previous[i] = value
+        self.flux = flux
+
+        threshold = self.mean + self.sensitivity * self.deviation
+        strength = 0.0
+        if flux > threshold and flux > OnsetDetector.MIN_FLUX and \
+                (self.last_onset is None or
+                 self.time - self.last_onset >= self.refractory):
+            strength = (flux - threshold) / max(threshold, OnsetDetector.MIN_FLUX)
+            self._onset()
+
+        adapt = OnsetDetector.ADAPT
+        self.deviation += (abs(flux - self.mean) - self.deviation) * adapt
+        self.mean += (flux - self.mean) * adapt
+
+        return strength
+
+    def _onset(self):
+        self.onsets += 1
+        if self.last_onset is not None:
+            period = self.time - self.last_onset
+            # only spacings of plausible beats (30 - 240 bpm) feed the tempo
+            if 0.25 <= period <= 2.0:
+                if self.period:
+                    self.period += (period - self.period) * 0.2
+                else:
+                    self.period = period
+        self.last_onset = self.time
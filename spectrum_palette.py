@@ -0,0 +1,171 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# colour palettes for the spectrum bars.
+#
+# The 'palette' setting holds either the name of one of the PALETTES below
+# or a palette definition of ';' separated options, for example
+#
+#   stops=0:#ff0000,0.4:#ffff00,0.7:#00c000;by-level=true;alpha=0.6
+#
+#   stops     - position (0 top, 1 bottom):colour pairs of the vertical gradient
+#   hue-span  - degrees the hue rotates from the first band to the last
+#   by-level  - true to fix the gradient to the full height so a bar's
+#               colour shows its level; otherwise it is fitted to each bar
+#   alpha     - opacity of the bars
+#   peak      - colour of the peak markers
+#
+# A palette is compiled once for a given band count into per band gradient
+# stops and a lookup table, so drawing costs the same whatever the palette.
+
+from array import array
+import colorsys
+
+
+def parse_colour(text):
+    '''
+    returns the (r, g, b) floats of a '#rrggbb' colour
+    '''
+    text = text.strip().lstrip('#')
+    if len(text) != 6:
+        raise ValueError("invalid colour '%s'" % text)
+
+    return tuple(int(text[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+
+
+class Palette(object):
+    '''
+    colours of the bars and peak markers
+
+    :param stops: list of (position, (r, g, b)) vertical gradient stops,
+      position 0 at the top
+    :param hue_span: `float` degrees of hue rotation across the bands
+    :param by_level: `bool` colour follows the level rather than each bar
+    :param alpha: `float` opacity of the bars
+    :param peak: (r, g, b) colour of the peak markers
+    '''
+
+    def __init__(self, stops, hue_span=0.0, by_level=False, alpha=0.5,
+                 peak=(0.0, 1.0, 1.0)):
+        self.stops = sorted(stops)
+        self.hue_span = hue_span
+        self.by_level = by_level
+        self.alpha = alpha
+        self.peak = peak
+
+    @classmethod
+    def from_string(cls, text):
+        '''
+        returns the named palette, or one parsed from a definition; the
+        default palette if neither can be read
+        '''
+        if text in PALETTES:
+            return PALETTES[text]
+
+        try:
+            options = {}
+            for option in text.split(';'):
+                if option.strip():
+                    key, value = option.split('=', 1)
+                    options[key.strip()] = value.strip()
+
+            stops = []
+            for stop in options['stops'].split(','):
+                position, colour = stop.split(':')
+                stops.append((float(position), parse_colour(colour)))
+
+            palette = cls(stops,
+                          hue_span=float(options.get('hue-span', 0)),
+                          by_level=options.get('by-level', 'false') == 'true',
+                          alpha=min(max(float(options.get('alpha', 0.5)), 0.0), 1.0))
+            if 'peak' in options:
+                palette.peak = parse_colour(options['peak'])
+        except (KeyError, ValueError) as e:
+            print("invalid spectrum palette '%s': %s" % (text, e))
+            return PALETTES[DEFAULT_PALETTE]
+
+        return palette
+
+    @property
+    def per_band(self):
+        '''
+        True if the bands are not all the same colour
+        '''
+        return self.hue_span != 0
+
+    def band_stops(self, bands):
+        '''
+        returns the gradient stops of each band - the hue map applied to
+        the palette's stops
+        '''
+        if not self.per_band:
+            return [self.stops] * bands
+
+        table = []
+        for band in range(bands):
+            shift = self.hue_span * band / max(bands - 1, 1) / 360.0
+            stops = []
+            for position, (r, g, b) in self.stops:
+                h, l, s = colorsys.rgb_to_hls(r, g, b)
+                stops.append((position, colorsys.hls_to_rgb((h + shift) % 1.0, l, s)))
+            table.append(stops)
+
+        return table
+
+    def lut(self, bands, rows=64):
+        '''
+        returns an array of rows x bands RGB bytes sampling each band's
+        gradient from top to bottom
+        '''
+        table = array('B', bytes(rows * bands * 3))
+        for band, stops in enumerate(self.band_stops(bands)):
+            for row in range(rows):
+                r, g, b = _interpolate(stops, row / float(rows - 1))
+                offset = (row * bands + band) * 3
+                table[offset] = int(round(r * 255))
+                table[offset + 1] = int(round(g * 255))
+                table[offset + 2] = int(round(b * 255))
+
+        return table
+
+
+def _interpolate(stops, position):
+    if position <= stops[0][0]:
+        return stops[0][1]
+
+    for (start, colour_start), (end, colour_end) in zip(stops, stops[1:]):
+        if position <= end:
+            fraction = (position - start) / (end - start) if end > start else 1.0
+            return tuple(a + (b - a) * fraction
+                         for a, b in zip(colour_start, colour_end))
+
+    return stops[-1][1]
+
+
+DEFAULT_PALETTE = 'classic'
+
+PALETTES = {
+    'classic': Palette([(0.3, (0.75, 0.0, 0.0)), (0.8, (0.0, 0.0, 0.5))]),
+    'rainbow': Palette([(0.2, (1.0, 0.3, 0.3)), (1.0, (0.4, 0.05, 0.05))],
+                       hue_span=300.0, alpha=0.6),
+    'meter': Palette([(0.0, (1.0, 0.0, 0.0)), (0.3, (1.0, 0.9, 0.0)),
+                      (0.6, (0.0, 0.8, 0.0))], by_level=True, alpha=0.7,
+                     peak=(1.0, 1.0, 1.0)),
+    'ice': Palette([(0.0, (0.85, 0.95, 1.0)), (1.0, (0.0, 0.2, 0.5))],
+                   alpha=0.7, peak=(1.0, 1.0, 1.0)),
+}
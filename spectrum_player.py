@@ -0,0 +1,703 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# spectrum analyser widget - imported on first use by the plugin so that
+# cairo is not loaded during Rhythmbox start-up
+
+from array import array
+import time
+
+from gi.repository import Gtk
+from gi.repository import GLib
+from gi.repository import Gdk
+from gi.repository import GObject
+import cairo
+
+from spectrum_bars import BarRenderer
+from spectrum_smooth import FrameSmoother
+from spectrum_governor import QualityGovernor
+from spectrum_history import SpectralHistory
+from spectrum_layout import BandLayout
+from spectrum_layout import DISPLAY_BANDS
+from spectrum_layout import FIRST_BAND
+from spectrum_layout import PEAK_DECAY_INTERVAL
+from spectrum_layout import group_ranges
+from spectrum_layout import lower_peaks
+from spectrum_layout import natural_width
+from spectrum_layout import raise_peaks
+from spectrum_layout import scale_bands
+from spectrum_onset import OnsetDetector
+from spectrum_palette import DEFAULT_PALETTE
+from spectrum_palette import PALETTES
+
+# opacity an onset pulse adds to the bars, and for how long
+PULSE_ALPHA = 0.4
+PULSE_TIME = 0.25
+
+
+class SpectrumPlayer(Gtk.DrawingArea):
+    '''
+    draws the frames published by a shared SpectrumAnalyser
+
+    emits 'onset' with the onset strength when a beat or other onset is
+    detected in the frames
+    '''
+
+    __gsignals__ = {
+        'onset': (GObject.SignalFlags.RUN_LAST, None, (float,))
+    }
+
+    def __init__(self, analyser):
+        super(SpectrumPlayer, self).__init__()
+
+        # init
+        self.analyser = analyser
+        self.subscriber = None
+        # True between initialise() and cleanup() - frames are only
+        # subscribed to whilst the view is also mapped
+        self.active = False
+
+        # bands in the analyser's frames, and the most that are displayed
+        self.analysed_bands = analyser.bands
+        self.max_bands = min(analyser.bands, DISPLAY_BANDS)
+        self.min_band_width = 4
+        self.spect_height = 100
+        self.spect_bands = self.max_bands
+        self.spect_atom = float(DISPLAY_BANDS)
+        self.height_scale = 1.0
+        self.band_width = self.min_band_width
+        self.band_interval = 3
+        self.spect_data = None
+        self.threshold = analyser.threshold
+        # bar positions for the current size
+        self.layout = None
+        # scaled frames are written in place into these, alternately, so
+        # the frame being shown is never the one being filled
+        self.buffers = [array('d'), array('d')]
+        self.buffer_index = 0
+        # (start, end) analyser bands merged into each displayed band
+        self.band_ranges = None
+        # paints the bars from cached gradients. Rebuilt when the size or
+        # the palette changes
+        self.palette = PALETTES[DEFAULT_PALETTE]
+        self.bars = None
+
+        # widget currently displaying the frames - either this DrawingArea
+        # or an OpenGL view sharing its frame data
+        self.view = self
+        self.renderer = 'cairo'
+        # horizontal scrolling of the enclosing viewport
+        self.hadjustment = None
+        self.hadjustment_id = None
+
+        self.props.hexpand = True
+        #self.props.vexpand = True
+        self.connect("draw", self.draw_cb)
+        self.connect("configure-event", self.on_configure_event)
+        self.connect("notify::scale-factor", self.on_scale_factor_changed)
+        self.connect("map", self.on_view_map)
+        self.connect("unmap", self.on_view_unmap)
+
+        self.drag_flag = False
+        self.mouse_x = self.mouse_y = 0
+        self.old_x = self.old_y = 0
+
+        self.max_magnitude = array('d')
+        # peak decay timer - only runs whilst peaks are above the floor
+        self.decay_id = None
+        self.frame_received = False
+        # number of timer/idle callbacks run by this widget
+        self.wakeups = 0
+
+        # interpolates between analysis frames at the display rate
+        self.smoother = FrameSmoother()
+        self.smoothing = True
+        self.tick_id = None
+        # True whilst the frame clock is interpolating towards a frame
+        self.smoothing_frames = False
+        # the latest analyser frame, shown on the next frame clock tick;
+        # pending_time is when it was decoded
+        self.latest = array('d')
+        self.pending = False
+        self.pending_time = 0
+
+        # drops band count, alpha groups and frame rate when drawing
+        # cannot keep up
+        self.governor = QualityGovernor(self.on_quality_changed)
+        # device pixels per logical pixel of the view
+        self.scale_factor = 1
+        self.band_limit = self.max_bands
+        self._request_width()
+        self.use_groups = True
+        self.low_fps = 5
+        self.last_size = None
+
+        # the last few minutes of frames, by stream position
+        self.history = SpectralHistory(analyser.bands, analyser.interval,
+                                       floor=analyser.threshold)
+
+        # onsets are detected from every frame received
+        self.onset_detector = OnsetDetector(analyser.interval)
+        self.pulse = False
+        # monotonic time (seconds) of the last onset
+        self.pulse_time = 0.0
+
+        self.show_stats = False
+        self.draw_count = 0
+        self.draw_rate = 0.0
+        self.draw_count_time = time.monotonic()
+
+    def initialise(self):
+        print("initialise")
+        if self.active:
+            return
+
+        self.active = True
+        self.analyser.start()
+        self._subscribe()
+
+    def cleanup(self):
+        if self.decay_id:
+            GLib.source_remove(self.decay_id)
+            self.decay_id = None
+
+        self._stop_ticking()
+
+        self.active = False
+        self._unsubscribe()
+
+        self._watch_scrolling(None)
+
+    def _subscribe(self):
+        if self.subscriber:
+            return
+
+        self.subscriber = self.analyser.subscribe(
+            self.on_event_load_spect, every_frame=self.on_frame_analysed)
+        if self.governor.tier >= QualityGovernor.LOW_FPS:
+            self.subscriber.set_max_fps(self.low_fps)
+
+    def _unsubscribe(self):
+        if self.subscriber:
+            self.analyser.unsubscribe(self.subscriber)
+            self.subscriber = None
+
+    def on_view_map(self, widget):
+        if widget is self.view and self.active:
+            self._subscribe()
+
+    def on_view_unmap(self, widget):
+        # e.g. the scroll was hidden once playback stopped - without a
+        # subscriber the analyser stops parsing messages for this view
+        if widget is self.view:
+            self._unsubscribe()
+
+    def set_renderer(self, renderer):
+        '''
+        chooses the widget used to display the frames; returns the view.
+        'opengl' falls back to cairo when PyOpenGL is not installed.
+        If the current view is already packed it is swapped in place.
+        '''
+        if renderer == 'opengl':
+            import spectrum_gl
+            if not spectrum_gl.gl_available():
+                print("OpenGL renderer unavailable - using cairo")
+                renderer = 'cairo'
+
+        if renderer == self.renderer:
+            return self.view
+
+        self._stop_ticking()
+
+        if renderer == 'opengl':
+            view = spectrum_gl.SpectrumGLArea(self)
+        else:
+            view = self
+
+        # the new view takes over before it is mapped so that the
+        # subscription carries across the swap
+        old_view = self.view
+        self.view = view
+        self.renderer = renderer
+        old_view.set_size_request(-1, -1)
+        self._request_width()
+
+        parent = old_view.get_parent()
+        if parent:
+            parent.remove(old_view)
+            parent.add(view)
+            view.show_all()
+
+        if old_view is not self:
+            old_view.destroy()
+
+        return view
+
+    def visible_bands(self, bands):
+        '''
+        returns the (first, end) range of bands that are at least partly
+        inside the visible part of the ScrolledWindow. The bottom two bands
+        are never drawn.
+        '''
+        parent = self.view.get_parent()
+        if isinstance(parent, Gtk.Scrollable):
+            adjustment = parent.get_hadjustment()
+            self._watch_scrolling(adjustment)
+            if adjustment and adjustment.get_page_size() > 0:
+                left = adjustment.get_value()
+                return self.layout.visible(left, left + adjustment.get_page_size(),
+                                           bands)
+
+        return FIRST_BAND, bands
+
+    def _watch_scrolling(self, adjustment):
+        # bars scrolled into view were skipped by the last draw
+        if adjustment is self.hadjustment:
+            return
+
+        if self.hadjustment:
+            self.hadjustment.disconnect(self.hadjustment_id)
+        self.hadjustment = adjustment
+        self.hadjustment_id = None
+        if adjustment:
+            self.hadjustment_id = adjustment.connect(
+                'value-changed', lambda *args: self.view.queue_draw())
+
+    @property
+    def adjust_width(self):
+        return (self.band_width + self.band_interval) * self.spect_bands
+
+    def _start_decay(self):
+        if not self.decay_id:
+            self.decay_id = Gdk.threads_add_timeout(GLib.PRIORITY_DEFAULT_IDLE,
+                                                    PEAK_DECAY_INTERVAL,
+                                                    self.max_levels, None)
+
+    def decay_peaks(self):
+        '''
+        lowers the peak markers one step; returns True if any are still
+        above the floor
+        '''
+        return lower_peaks(self.max_magnitude, self.threshold * self.height_scale,
+                           int(self.spect_bands))
+
+    def max_levels(self, *args):
+        self.wakeups += 1
+
+        decaying = self.decay_peaks()
+
+        if not decaying or not self.view.get_mapped():
+            # all peaks have fallen to the floor (or nobody can see them) -
+            # the next frame restarts the timer
+            self.decay_id = None
+            return False
+
+        if not self.frame_received:
+            # playback has stopped - redraw so the peaks visibly fall
+            self.view.queue_draw()
+
+        self.frame_received = False
+        return True
+
+    def draw_cb(self, widget, cr):
+        rect = widget.get_allocation()
+
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        #cr.set_source_rgba(1.0, 1.0, 1.0, 0.0)
+        context = self.get_toplevel().get_style_context()
+        bg_colour = context.get_background_color(Gtk.StateFlags.NORMAL)
+        Gdk.cairo_set_source_rgba(cr, bg_colour)
+        cr.rectangle(0, 0, rect.width, rect.height)
+        cr.fill()
+
+        cr.set_operator(cairo.OPERATOR_OVER)
+        start = time.perf_counter()
+        self.draw_spectrum(cr)
+        self.frame_drawn(time.perf_counter() - start)
+
+        if self.show_stats:
+            self.draw_stats(cr)
+
+        if self.analyser.loudness:
+            self.draw_loudness(cr, rect.width)
+
+        return True
+
+
+    def _request_width(self):
+        # the width every band needs at the minimum bar width - narrower
+        # than this the enclosing viewport scrolls rather than bands being
+        # dropped
+        self.view.set_size_request(
+            natural_width(self.band_limit, self.min_band_width, self.band_interval), -1)
+
+    def _band_limit(self, tier):
+        if tier >= QualityGovernor.HALF_BANDS:
+            return self.max_bands // 2
+
+        return self.max_bands
+
+    def set_analysed_bands(self, bands):
+        '''
+        called when the analyser's frames change length, e.g. for a new
+        analysis preset
+        '''
+        self.analysed_bands = bands
+        self.max_bands = min(bands, DISPLAY_BANDS)
+        self.history.reset(bands, self.analyser.interval)
+        self.onset_detector.interval = self.analyser.interval
+        self.band_limit = self._band_limit(self.governor.tier)
+        self._request_width()
+        if self.last_size:
+            self.resize(*self.last_size)
+
+    def on_quality_changed(self, tier):
+        self.use_groups = tier < QualityGovernor.NO_ALPHA_GROUPS
+
+        band_limit = self._band_limit(tier)
+        if band_limit != self.band_limit:
+            self.band_limit = band_limit
+            self._request_width()
+            if self.last_size:
+                self.resize(*self.last_size)
+
+        if self.subscriber:
+            if tier >= QualityGovernor.LOW_FPS:
+                self.subscriber.set_max_fps(self.low_fps)
+            else:
+                self.subscriber.set_max_fps(0)
+
+        if tier >= QualityGovernor.LOW_FPS:
+            self._stop_ticking()
+
+        self.view.queue_draw()
+
+    def set_show_stats(self, enabled):
+        self.show_stats = enabled
+        self.view.queue_draw()
+
+    def frame_drawn(self, seconds):
+        '''
+        called by the view once a frame has been drawn
+        '''
+        self.governor.frame_drawn(seconds)
+
+        self.draw_count += 1
+        now = time.monotonic()
+        if now - self.draw_count_time >= 1.0:
+            self.draw_rate = self.draw_count / (now - self.draw_count_time)
+            self.draw_count = 0
+            self.draw_count_time = now
+
+    def stats_text(self):
+        '''
+        returns the lines shown by the statistics overlay
+        '''
+        dropped = self.subscriber.dropped if self.subscriber else 0
+        return ["quality: %s" % self.governor.tier_name,
+                "draw %.2f ms  latency %.2f ms  %.0f fps" %
+                (self.governor.frame_time * 1000, self.governor.latency * 1000,
+                 self.draw_rate),
+                "bands %d  scale %d  wakeups %d  dropped %d" %
+                (int(self.spect_bands), self.scale_factor, self.wakeups, dropped),
+                "frames %d  deliveries %d  lost %d  parsers %d" %
+                (self.analyser.frames, self.analyser.notifications,
+                 self.analyser.lost, self.analyser.parsers),
+                "%s  %d bands  parse %.2f ms  samples %.0f%%" %
+                (self.analyser.preset, self.analyser.bands,
+                 self.analyser.parse_time * 1000,
+                 self.analyser.sample_ratio * 100),
+                "onsets %d  tempo %.0f bpm" %
+                (self.onset_detector.onsets, self.onset_detector.tempo),
+                "history %.0f s  %d KB" %
+                (self.history.duration, self.history.nbytes // 1024)]
+
+    def draw_stats(self, cr):
+        cr.save()
+        cr.select_font_face("monospace", cairo.FONT_SLANT_NORMAL,
+                            cairo.FONT_WEIGHT_NORMAL)
+        cr.set_font_size(11)
+        y = 14
+        for line in self.stats_text():
+            cr.move_to(6, y)
+            cr.set_source_rgba(0, 0, 0, 0.6)
+            cr.show_text(line)
+            cr.move_to(5, y - 1)
+            cr.set_source_rgb(1, 1, 1)
+            cr.show_text(line)
+            y += 14
+        cr.restore()
+
+    def draw_loudness(self, cr, width):
+        meter = self.analyser.meter
+        line = "M %.1f  S %.1f LUFS  RMS %.1f dB" % (meter.momentary,
+                                                   meter.short_term, meter.rms)
+        clipping = meter.will_clip(self.analyser.volume())
+
+        cr.save()
+        cr.select_font_face("monospace", cairo.FONT_SLANT_NORMAL,
+                            cairo.FONT_WEIGHT_NORMAL)
+        cr.set_font_size(11)
+        if clipping:
+            line += "  CLIP"
+        extents = cr.text_extents(line)
+        cr.move_to(width - extents.x_advance - 6, 14)
+        if clipping:
+            cr.set_source_rgb(1, 0.2, 0.2)
+        else:
+            cr.set_source_rgb(1, 1, 1)
+        cr.show_text(line)
+        cr.restore()
+
+    def set_pulse(self, enabled):
+        '''
+        brightens the bars briefly on each onset
+        '''
+        self.pulse = enabled
+
+    def bar_alpha(self):
+        '''
+        returns the current opacity of the bars, raised just after an onset
+        '''
+        alpha = self.palette.alpha
+        if not self.pulse:
+            return alpha
+
+        fade = 1.0 - (time.monotonic() - self.pulse_time) / PULSE_TIME
+        return min(alpha + PULSE_ALPHA * max(fade, 0.0), 1.0)
+
+    def set_palette(self, palette):
+        '''
+        sets the `Palette` used to colour the bars
+        '''
+        self.palette = palette
+        self.bars = None
+        self.view.queue_draw()
+
+    def set_smoothing(self, enabled):
+        self.smoothing = enabled
+        if not enabled:
+            self._stop_ticking()
+            self.smoother.reset()
+
+    def _stop_ticking(self):
+        if self.tick_id:
+            self.view.remove_tick_callback(self.tick_id)
+            self.tick_id = None
+        self.smoothing_frames = False
+
+    def _start_ticking(self):
+        if not self.tick_id:
+            self.tick_id = self.view.add_tick_callback(self.on_tick)
+
+    def on_tick(self, widget, frame_clock):
+        self.wakeups += 1
+
+        if self.pending:
+            # however many frames were delivered since the last tick, only
+            # the latest is scaled and shown
+            self.pending = False
+            self.delayed_idle_spectrum_update(self.scale_frame(self.latest),
+                                              self.pending_time)
+
+        if not self.smoothing_frames:
+            self.tick_id = None
+            return False
+
+        now = frame_clock.get_frame_time() / 1000000.0
+
+        self.spect_data = self.smoother.advance(now)
+        self.view.queue_draw()
+
+        if self.smoother.settled(now):
+            self.spect_data = self.smoother.values
+            self.smoothing_frames = False
+            self.tick_id = None
+            return False
+
+        return True
+
+    def delayed_idle_spectrum_update(self, spect, scheduled):
+        self.frame_received = True
+        self.governor.frame_delayed((GLib.get_monotonic_time() - scheduled) / 1000000.0)
+        self.update_peaks(spect)
+
+        if self.smoothing and self.governor.tier < QualityGovernor.LOW_FPS:
+            # the frame clock drives the redraws until the display has
+            # caught up with this frame
+            self.smoother.push(spect, GLib.get_monotonic_time() / 1000000.0)
+            self.smoothing_frames = True
+        else:
+            self.smoothing_frames = False
+            self.spect_data = spect
+            self.view.queue_draw()
+
+        self._start_decay()
+
+        return False
+
+    def update_peaks(self, spect):
+        raise_peaks(self.max_magnitude, spect, int(self.spect_bands))
+
+    def on_frame_analysed(self, magnitude_list):
+        '''
+        called for every frame the analyser decodes, including those
+        coalesced before the display could show them
+        '''
+        if len(magnitude_list) != self.analysed_bands:
+            self.set_analysed_bands(len(magnitude_list))
+        elif self.history.interval != self.analyser.interval:
+            # e.g. balanced to low latency - same bands, but the history's
+            # capacity and frame spacing no longer match
+            self.history.reset(self.analysed_bands, self.analyser.interval)
+            self.onset_detector.interval = self.analyser.interval
+
+        self.history.append(magnitude_list, self.analyser.stream_time)
+
+        strength = self.onset_detector.add(magnitude_list,
+                                           self.analyser.stream_time / 1e9)
+        if strength:
+            self.pulse_time = time.monotonic()
+            self.emit('onset', strength)
+
+    def on_event_load_spect(self, magnitude_list):
+        if not self.view.get_mapped():
+            return
+
+        # shown on the next frame clock tick - at most once per display frame
+        if len(self.latest) != len(magnitude_list):
+            self.latest = array('d', magnitude_list)
+        else:
+            self.latest[:] = magnitude_list
+        self.pending = True
+        self.pending_time = self.analyser.frame_time
+        self._start_ticking()
+
+    def scale_frame(self, magnitude_list):
+        '''
+        returns the frame scaled to the view's bands and height. The result
+        is one of two buffers used in turn - copy it to keep it
+        '''
+        if len(magnitude_list) != self.analysed_bands:
+            self.set_analysed_bands(len(magnitude_list))
+
+        if self.band_ranges:
+            bands = len(self.band_ranges)
+        else:
+            bands = len(magnitude_list)
+
+        self.buffer_index = 1 - self.buffer_index
+        spect = self.buffers[self.buffer_index]
+        if len(spect) != bands:
+            spect = self.buffers[self.buffer_index] = array('d', [0.0] * bands)
+
+        scale_bands(magnitude_list, self.band_ranges, self.height_scale, spect)
+
+        #AUDIOFREQ=32000.0
+        #for i in range(int(self.spect_bands)):
+        #    freq = ((AUDIOFREQ / 2) * i + AUDIOFREQ / 4) / self.spect_bands
+        #    mag = magnitude_list[i]
+
+        #    print ('band %d freq %g mag %f' % (i, freq, mag))
+
+        return spect
+
+    def on_configure_event(self, widget, event):
+        print("on_configure_event")
+        return self.resize(event.width, event.height)
+
+    def on_scale_factor_changed(self, widget, spec):
+        # e.g. the window moved to a monitor with a different scale - the
+        # geometry and the cached gradients are in device pixels
+        if widget is self.view and self.last_size:
+            self.resize(*self.last_size)
+            self.view.queue_draw()
+
+    def resize(self, width, height):
+        '''
+        recalculates the band geometry for the view's new size - called for
+        whichever widget (cairo or OpenGL) is currently displaying the frames
+        '''
+        print (width)
+        self.last_size = (width, height)
+        old_scale = self.height_scale
+        self.spect_height = height
+        self.height_scale = height / self.spect_atom
+
+        self.scale_factor = self.view.get_scale_factor()
+        layout = self.layout = BandLayout(width, height, self.band_limit,
+                                          self.min_band_width, self.band_interval,
+                                          self.scale_factor)
+        self.band_width = layout.band_width
+        self.spect_bands = layout.bands
+
+        print (layout.bands)
+        if layout.bands == 0:
+            return False
+
+        bands = layout.bands
+        self.band_ranges = group_ranges(self.analysed_bands, bands)
+
+        # keep the peak history (e.g. when the widget is moved between the
+        # sidebar and the bottom of the window) rescaled to the new height
+        ratio = self.height_scale / old_scale if old_scale else 1.0
+        floor = self.threshold * self.height_scale
+        peaks = array('d', [value * ratio for value in self.max_magnitude[:bands]])
+        peaks.extend([floor] * (bands - len(peaks)))
+        self.max_magnitude = peaks
+
+        for frame in self.buffers:
+            for i in range(len(frame)):
+                frame[i] *= ratio
+
+        self.smoother.rescale(ratio)
+        self.bars = None
+
+        latest = self.history.latest()
+        if latest is not None and not self.tick_id:
+            # the last frame again at the new size - the band grouping may
+            # have changed, so it cannot just be rescaled
+            self.spect_data = self.scale_frame(latest)
+
+        print(self.height_scale)
+
+        return False
+
+    def prepare_bar_surface(self, cr):
+        '''
+        creates the cached bar gradients if the size or palette changed
+        '''
+        if not self.bars:
+            self.bars = BarRenderer(cr, self.layout, self.palette,
+                                    self.spect_height, self.get_window(),
+                                    self.scale_factor)
+
+    def draw_spectrum(self, cr):
+        '''
+        draws the bars and peak markers of the latest frame
+        '''
+        data = self.spect_data
+        peaks = self.max_magnitude
+        layout = self.layout
+        if data and layout and layout.bands and self.spect_height > 0:
+            self.prepare_bar_surface(cr)
+            # ignore the bottom end of the spectrum and anything scrolled
+            # out of view
+            first, end = self.visible_bands(min(layout.bands, len(data), len(peaks)))
+            self.bars.draw(cr, data, peaks, first, end, self.bar_alpha(),
+                           self.use_groups)
@@ -33,6 +33,10 @@ from gi.repository import GLib
 import rb
 import spectrum_rb3compat as rb3compat
 
+# milliseconds of quiet after the last change before the pending settings
+# are written in one go
+APPLY_DELAY = 250
+
 
 class GSetting:
     '''
@@ -55,7 +59,17 @@ class GSetting:
 
 
             self.PluginKey = self._enum(
-                POSITION='position')
+                POSITION='position',
+                RENDERER='renderer',
+                SMOOTHING='smoothing',
+                STREAM_FRAMES='stream-frames',
+                SHOW_STATS='show-stats',
+                LOUDNESS='loudness',
+                FINGERPRINTS='fingerprints',
+                BEAT_PULSE='beat-pulse',
+                PALETTE='palette',
+                ANALYSIS_PRESET='analysis-preset',
+                DOWNMIX='downmix')
 
             self.setting = {}
 
@@ -123,7 +137,12 @@ class Preferences(GObject.Object, PeasGtk.Configurable):
         '''
         GObject.Object.__init__(self)
         gs = GSetting()
-        self.settings = gs.get_setting(gs.Path.PLUGIN)
+        # a private instance in delay-apply mode - changes are held here and
+        # reach the plugin's bindings together when apply() is called
+        self.settings = Gio.Settings.new(gs.Path.PLUGIN)
+        self.settings.delay()
+        self.apply_id = 0
+        self._dialog = None
 
         self._first_run = True
 
@@ -134,34 +153,70 @@ class Preferences(GObject.Object, PeasGtk.Configurable):
         return self._create_display_contents(self)
 
     def display_preferences_dialog(self, plugin):
-        print("DEBUG - display_preferences_dialog")
-        if self._first_run:
-            self._first_run = False
-
-            self._dialog = Gtk.Dialog(modal=True, destroy_with_parent=True)
+        '''
+        shows the preferences in a non-modal dialog; the rhythmbox main loop
+        keeps running while it is open
+        '''
+        if not self._dialog:
+            self._dialog = Gtk.Dialog(destroy_with_parent=True)
+            self._dialog.add_button(Gtk.STOCK_HELP, Gtk.ResponseType.HELP)
             self._dialog.add_button(Gtk.STOCK_OK, Gtk.ResponseType.OK)
             self._dialog.set_title(_('Spectrum Preferences'))
             content_area = self._dialog.get_content_area()
             content_area.pack_start(self._create_display_contents(plugin), True, True, 0)
 
-            helpbutton = self._dialog.add_button(Gtk.STOCK_HELP, Gtk.ResponseType.HELP)
-            helpbutton.connect('clicked', self._display_help)
+            self._dialog.connect('response', self._on_dialog_response)
+            self._dialog.connect('delete-event', self._on_dialog_delete)
 
         self._dialog.show_all()
+        self._dialog.present()
 
-        print("shown")
+    def _on_dialog_response(self, dialog, response):
+        if response == Gtk.ResponseType.HELP:
+            self._display_help()
+            return
 
-        while True:
-            response = self._dialog.run()
+        self.apply_changes()
+        dialog.hide()
 
-            print("and run")
+    def _on_dialog_delete(self, dialog, event):
+        self.apply_changes()
+        return dialog.hide_on_delete()
 
-            if response != Gtk.ResponseType.HELP:
-                break
+    def _display_help(self, *args):
+        webbrowser.open(
+            'https://github.com/fossfreedom/rhythmbox-spectrum/blob/master/README.md')
 
-        self._dialog.hide()
+    def _set(self, key, value):
+        '''
+        holds a changed value and (re)starts the timer that applies it, so a
+        burst of changes is written as one transaction
+        '''
+        if self._first_run or self.settings[key] == value:
+            return
 
-        print("DEBUG - display_preferences_dialog end")
+        self.settings[key] = value
+
+        if self.apply_id:
+            GLib.source_remove(self.apply_id)
+        self.apply_id = GLib.timeout_add(APPLY_DELAY, self._on_apply_timeout)
+
+    def _on_apply_timeout(self):
+        self.apply_id = 0
+        self.settings.apply()
+
+        return False
+
+    def apply_changes(self, *args):
+        '''
+        writes any held changes straight away
+        '''
+        if self.apply_id:
+            GLib.source_remove(self.apply_id)
+            self.apply_id = 0
+
+        if self.settings.get_has_unapplied():
+            self.settings.apply()
 
     def _create_display_contents(self, plugin):
         print("DEBUG - create_display_contents")
@@ -185,17 +240,94 @@ class Preferences(GObject.Object, PeasGtk.Configurable):
         else:
             self.bottom_position_radiobutton.set_active(True)
 
+        self.opengl_checkbutton = builder.get_object('opengl_checkbutton')
+        self.opengl_checkbutton.set_active(
+            self.settings[gs.PluginKey.RENDERER] == 'opengl')
+
+        self.smoothing_checkbutton = builder.get_object('smoothing_checkbutton')
+        self.smoothing_checkbutton.set_active(self.settings[gs.PluginKey.SMOOTHING])
+
+        self.stats_checkbutton = builder.get_object('stats_checkbutton')
+        self.stats_checkbutton.set_active(self.settings[gs.PluginKey.SHOW_STATS])
+
+        self.loudness_checkbutton = builder.get_object('loudness_checkbutton')
+        self.loudness_checkbutton.set_active(self.settings[gs.PluginKey.LOUDNESS])
+
+        self.pulse_checkbutton = builder.get_object('pulse_checkbutton')
+        self.pulse_checkbutton.set_active(self.settings[gs.PluginKey.BEAT_PULSE])
+
+        self.palette_combobox = builder.get_object('palette_combobox')
+        palette = self.settings[gs.PluginKey.PALETTE]
+        if not self.palette_combobox.set_active_id(palette):
+            # a palette definition rather than one of the named palettes
+            self.palette_combobox.append(palette, _("custom"))
+            self.palette_combobox.set_active_id(palette)
+
+        self.preset_combobox = builder.get_object('preset_combobox')
+        self.preset_combobox.set_active_id(self.settings[gs.PluginKey.ANALYSIS_PRESET])
+
+        self.downmix_checkbutton = builder.get_object('downmix_checkbutton')
+        self.downmix_checkbutton.set_active(self.settings[gs.PluginKey.DOWNMIX])
+
+        self.fingerprints_checkbutton = builder.get_object('fingerprints_checkbutton')
+        self.fingerprints_checkbutton.set_active(self.settings[gs.PluginKey.FINGERPRINTS])
+
         self.builder = builder
         # return the dialog
         self._first_run = False
         print("end create dialog contents")
-        return builder.get_object('main_grid')
+        main_grid = builder.get_object('main_grid')
+        # the peas dialog destroys the widget when closed
+        main_grid.connect('destroy', self.apply_changes)
+        return main_grid
 
     def on_position_radiobutton_toggled(self, button):
         if button.get_active():
             gs = GSetting()
-            print (self.builder)
             if button == self.sidebar_position_radiobutton:
-                self.settings[gs.PluginKey.POSITION] = 1
+                self._set(gs.PluginKey.POSITION, 1)
             else:
-                self.settings[gs.PluginKey.POSITION] = 2
+                self._set(gs.PluginKey.POSITION, 2)
+
+    def on_opengl_checkbutton_toggled(self, button):
+        gs = GSetting()
+        if button.get_active():
+            self._set(gs.PluginKey.RENDERER, 'opengl')
+        else:
+            self._set(gs.PluginKey.RENDERER, 'cairo')
+
+    def on_smoothing_checkbutton_toggled(self, button):
+        gs = GSetting()
+        self._set(gs.PluginKey.SMOOTHING, button.get_active())
+
+    def on_stats_checkbutton_toggled(self, button):
+        gs = GSetting()
+        self._set(gs.PluginKey.SHOW_STATS, button.get_active())
+
+    def on_loudness_checkbutton_toggled(self, button):
+        gs = GSetting()
+        self._set(gs.PluginKey.LOUDNESS, button.get_active())
+
+    def on_pulse_checkbutton_toggled(self, button):
+        gs = GSetting()
+        self._set(gs.PluginKey.BEAT_PULSE, button.get_active())
+
+    def on_palette_combobox_changed(self, combobox):
+        gs = GSetting()
+        palette = combobox.get_active_id()
+        if palette:
+            self._set(gs.PluginKey.PALETTE, palette)
+
+    def on_preset_combobox_changed(self, combobox):
+        gs = GSetting()
+        preset = combobox.get_active_id()
+        if preset:
+            self._set(gs.PluginKey.ANALYSIS_PRESET, preset)
+
+    def on_downmix_checkbutton_toggled(self, button):
+        gs = GSetting()
+        self._set(gs.PluginKey.DOWNMIX, button.get_active())
+
+    def on_fingerprints_checkbutton_toggled(self, button):
+        gs = GSetting()
+        self._set(gs.PluginKey.FINGERPRINTS, button.get_active())
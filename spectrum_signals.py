@@ -0,0 +1,82 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+
+class SignalConnections(object):
+    '''
+    keeps the handlers an object has connected together with the objects
+    they are connected to, so each is connected at most once and always
+    disconnected from the right object
+    '''
+
+    # handlers connected by all instances, by signal name - a count above
+    # one for a signal connected once (e.g. the bus 'message' parser)
+    # shows a leak, such as after the plugin is reloaded
+    active = {}
+
+    def __init__(self):
+        # key -> (object, signal, handler id)
+        self.handlers = {}
+
+    def __len__(self):
+        return len(self.handlers)
+
+    def connect(self, key, obj, signal, callback, *args):
+        '''
+        connects callback to signal on obj unless key is already connected;
+        returns True if it was connected
+        '''
+        if key in self.handlers:
+            return False
+
+        handler_id = obj.connect(signal, callback, *args)
+        self.handlers[key] = (obj, signal, handler_id)
+        SignalConnections.active[signal] = SignalConnections.active.get(signal, 0) + 1
+
+        return True
+
+    def is_connected(self, key):
+        return key in self.handlers
+
+    def owner(self, key):
+        '''
+        returns the object key is connected to, or None
+        '''
+        if key not in self.handlers:
+            return None
+
+        return self.handlers[key][0]
+
+    def disconnect(self, key):
+        if key not in self.handlers:
+            return
+
+        obj, signal, handler_id = self.handlers.pop(key)
+        obj.disconnect(handler_id)
+        SignalConnections.active[signal] -= 1
+
+    def disconnect_all(self):
+        for key in list(self.handlers):
+            self.disconnect(key)
+
+    @staticmethod
+    def count(signal):
+        '''
+        returns the number of handlers connected to signal by all instances
+        '''
+        return SignalConnections.active.get(signal, 0)
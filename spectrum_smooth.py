@@ -0,0 +1,146 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+from array import array
+import math
+
+
+class FrameSmoother(object):
+    '''
+    sits between the decoded analysis frames and the renderer. Frames
+    arrive at the analysis rate (typically 10 per second) and are
+    interpolated and passed through an attack/release envelope at the
+    display rate.
+
+    The frames are held in arrays that are updated in place; they are only
+    reallocated when the number of bands changes.
+
+    :param attack: `float` time constant (seconds) for rising bands
+    :param release: `float` time constant (seconds) for falling bands
+    :param interpolate: `bool` linearly interpolate between consecutive
+      frames - this delays the display by one analysis interval
+    '''
+
+    def __init__(self, attack=0.02, release=0.25, interpolate=True):
+        self.attack = attack
+        self.release = release
+        self.interpolate = interpolate
+
+        self.values = array('d')
+        self.previous = array('d')
+        self.target = array('d')
+        self.frame_time = 0.0
+        self.interval = 0.1
+        self.last_time = None
+
+    def reset(self):
+        self.values = array('d')
+        self.previous = array('d')
+        self.target = array('d')
+        self.last_time = None
+
+    def rescale(self, ratio):
+        '''
+        rescales the held frames when the display height changes
+        '''
+        for frame in (self.values, self.previous, self.target):
+            for i in range(len(frame)):
+                frame[i] *= ratio
+
+    def push(self, frame, now):
+        '''
+        adds a new analysis frame received at time `now` (seconds)
+        '''
+        if len(frame) != len(self.values):
+            # first frame or the number of bands changed - nothing to
+            # interpolate from
+            self.values = array('d', frame)
+            self.previous = array('d', frame)
+            self.target = array('d', frame)
+            self.frame_time = now
+            self.last_time = now
+            return
+
+        elapsed = now - self.frame_time
+        if 0 < elapsed < 1.0:
+            # running estimate of the analysis interval
+            self.interval += (elapsed - self.interval) * 0.2
+
+        # continue from wherever the interpolation had reached
+        pos = self._position(now)
+        previous = self.previous
+        target = self.target
+        for i in range(len(target)):
+            previous[i] += (target[i] - previous[i]) * pos
+            target[i] = frame[i]
+
+        self.frame_time = now
+
+    def _position(self, now):
+        '''
+        returns how far (0 to 1) the display should have moved from the
+        previous frame to the latest one
+        '''
+        if not self.interpolate or not self.interval:
+            return 1.0
+
+        pos = (now - self.frame_time) / self.interval
+        return min(max(pos, 0.0), 1.0)
+
+    def advance(self, now):
+        '''
+        moves the displayed values on to time `now` (seconds) and returns them
+        '''
+        if self.last_time is None:
+            self.last_time = now
+
+        dt = now - self.last_time
+        self.last_time = now
+        if dt <= 0:
+            return self.values
+
+        attack = 1.0 - math.exp(-dt / self.attack) if self.attack else 1.0
+        release = 1.0 - math.exp(-dt / self.release) if self.release else 1.0
+
+        pos = self._position(now)
+        values = self.values
+        previous = self.previous
+        target = self.target
+        for i in range(len(values)):
+            goal = previous[i] + (target[i] - previous[i]) * pos
+            value = values[i]
+            values[i] = value + (goal - value) * (attack if goal > value else release)
+
+        return values
+
+    def settled(self, now, tolerance=0.5):
+        '''
+        returns True (and snaps to the last frame) once the display has
+        caught up with it
+        '''
+        if self.interpolate and now - self.frame_time < self.interval:
+            return False
+
+        values = self.values
+        target = self.target
+        for i in range(len(values)):
+            if abs(target[i] - values[i]) > tolerance:
+                return False
+
+        values[:] = target
+        return True
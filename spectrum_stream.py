@@ -0,0 +1,211 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# publishes the decoded spectrum frames on a local unix socket so that
+# external programs (LED walls etc.) can follow the music being played.
+#
+# The socket is SOCK_SEQPACKET - every read returns exactly one fixed size
+# record (little endian):
+#
+#   4s  magic 'SPEC'
+#   H   record version
+#   H   number of valid bands
+#   I   sequence number of the analysis frame (gaps mean frames were lost -
+#       the client was too slow, or the main loop stalled)
+#   q   CLOCK_MONOTONIC time the frame was published, microseconds
+#   q   stream position of the frame, nanoseconds
+#   I   reserved
+#   64f band magnitudes in dB (unused bands are zero)
+#
+# spectrum_client.py is a reference client.
+
+from array import array
+import os
+import socket
+import struct
+import sys
+
+from gi.repository import GLib
+
+from spectrum_layout import group_ranges
+from spectrum_layout import scale_bands
+
+RECORD_VERSION = 1
+RECORD_BANDS = 64
+RECORD_FORMAT = '<4sHHIqqI%df' % RECORD_BANDS
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+HEADER_FORMAT = '<4sHHIqqI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+def default_socket_path():
+    return os.path.join(GLib.get_user_runtime_dir(), 'rhythmbox-spectrum.sock')
+
+
+class FrameServer(object):
+    '''
+    listens on a unix socket and writes every analyser frame to each
+    connected client. Clients that cannot keep up lose frames rather than
+    holding up the main loop.
+    '''
+
+    def __init__(self, analyser, path=None):
+        self.analyser = analyser
+        self.path = path or default_socket_path()
+
+        self.sock = None
+        self.watch_id = None
+        self.subscriber = None
+        self.clients = []
+        # io watch of each client socket, by socket
+        self.client_watches = {}
+
+        # one record reused for every frame
+        self.record = bytearray(RECORD_SIZE)
+        self.record_view = memoryview(self.record)
+        # the bands of each frame are written into this - grouped when a
+        # frame has more than RECORD_BANDS - and copied into the record
+        self.grouped = array('f', bytes(RECORD_BANDS * 4))
+        self.grouped_bytes = memoryview(self.grouped).cast('B')
+        # (start, end) bands grouped into each record band, and the frame
+        # length they were worked out for
+        self.ranges = None
+        self.frame_bands = 0
+        self.sequence = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def start(self):
+        if self.sock:
+            return
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.bind(self.path)
+        self.sock.listen(4)
+        self.sock.setblocking(False)
+
+        self.watch_id = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT,
+                                          GLib.IO_IN, self.on_accept)
+        print("spectrum frames published on %s" % self.path)
+
+    def stop(self):
+        if self.watch_id:
+            GLib.source_remove(self.watch_id)
+            self.watch_id = None
+
+        for conn in list(self.clients):
+            self._remove_client(conn)
+        self._update_subscription()
+
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def on_accept(self, fd, condition):
+        try:
+            conn, address = self.sock.accept()
+        except OSError:
+            return True
+
+        conn.setblocking(False)
+        self.clients.append(conn)
+        # notices clients that disconnect whilst no frames are being sent
+        self.client_watches[conn] = GLib.io_add_watch(
+            conn.fileno(), GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_client_event, conn)
+        self._update_subscription()
+
+        return True
+
+    def on_client_event(self, fd, condition, conn):
+        if condition & GLib.IO_IN and not condition & (GLib.IO_HUP | GLib.IO_ERR):
+            # clients are not expected to write - anything sent is discarded
+            try:
+                if conn.recv(RECORD_SIZE):
+                    return True
+            except BlockingIOError:
+                return True
+            except OSError:
+                pass
+
+        # the watch is removed by returning False
+        self.client_watches.pop(conn, None)
+        self._remove_client(conn)
+        self._update_subscription()
+
+        return False
+
+    def _remove_client(self, conn):
+        watch_id = self.client_watches.pop(conn, None)
+        if watch_id:
+            GLib.source_remove(watch_id)
+
+        if conn in self.clients:
+            self.clients.remove(conn)
+        conn.close()
+
+    def _update_subscription(self):
+        # only ask the analyser for frames whilst somebody is listening
+        if self.clients and not self.subscriber:
+            self.analyser.start()
+            self.subscriber = self.analyser.subscribe(every_frame=self.on_frame)
+        elif not self.clients and self.subscriber:
+            self.analyser.unsubscribe(self.subscriber)
+            self.subscriber = None
+
+    def on_frame(self, magnitude_list):
+        grouped = self.grouped
+        bands = min(len(magnitude_list), RECORD_BANDS)
+        if len(magnitude_list) != self.frame_bands:
+            # finer analysis presets are grouped down to the record size;
+            # unused bands stay zero
+            self.frame_bands = len(magnitude_list)
+            self.ranges = group_ranges(self.frame_bands, bands)
+            for i in range(bands, RECORD_BANDS):
+                grouped[i] = 0.0
+
+        scale_bands(magnitude_list, self.ranges, 1.0, grouped)
+        if sys.byteorder != 'little':
+            # rewritten for every frame, so it can be swapped in place
+            grouped.byteswap()
+
+        self.sequence = self.analyser.frame_number & 0xffffffff
+        struct.pack_into(HEADER_FORMAT, self.record, 0,
+                         b'SPEC', RECORD_VERSION, bands, self.sequence,
+                         GLib.get_monotonic_time(), self.analyser.stream_time, 0)
+        self.record_view[HEADER_SIZE:] = self.grouped_bytes
+
+        closed = []
+        for conn in self.clients:
+            try:
+                conn.send(self.record_view)
+                self.sent += 1
+            except BlockingIOError:
+                self.dropped += 1
+            except OSError:
+                closed.append(conn)
+
+        if closed:
+            for conn in closed:
+                self._remove_client(conn)
+            self._update_subscription()
@@ -0,0 +1,85 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+from gi.repository import Gtk
+from gi.repository import Gdk
+
+from spectrum_player import SpectrumPlayer
+
+
+class SpectrumWindow(Gtk.Window):
+    '''
+    top level window showing the spectrum outside of the main window. It
+    has its own SpectrumPlayer - and so its own cached surfaces and frame
+    rate - subscribed to the shared analyser. The view is always smoothed
+    so that it redraws at the monitor refresh rate.
+
+    F11 or a double click toggles full screen; Escape leaves it.
+    '''
+
+    def __init__(self, analyser, renderer='cairo'):
+        super(SpectrumWindow, self).__init__(title=_("Spectrum"))
+
+        self.set_default_size(800, 300)
+        self.fullscreen_state = False
+
+        self.spectrum = SpectrumPlayer(analyser)
+        self.spectrum.set_smoothing(True)
+        self.add(self.spectrum.set_renderer(renderer))
+
+        self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
+        self.connect('key-press-event', self.on_key_press)
+        self.connect('button-press-event', self.on_button_press)
+        self.connect('window-state-event', self.on_window_state)
+
+    def present_spectrum(self):
+        self.spectrum.initialise()
+        self.show_all()
+        self.present()
+
+    def cleanup(self):
+        self.spectrum.cleanup()
+        self.destroy()
+
+    def toggle_fullscreen(self):
+        if self.fullscreen_state:
+            self.unfullscreen()
+        else:
+            self.fullscreen()
+
+    def on_window_state(self, window, event):
+        self.fullscreen_state = bool(event.new_window_state &
+                                     Gdk.WindowState.FULLSCREEN)
+
+    def on_key_press(self, window, event):
+        if event.keyval == Gdk.KEY_F11:
+            self.toggle_fullscreen()
+            return True
+
+        if event.keyval == Gdk.KEY_Escape and self.fullscreen_state:
+            self.unfullscreen()
+            return True
+
+        return False
+
+    def on_button_press(self, window, event):
+        if event.type == Gdk.EventType._2BUTTON_PRESS:
+            self.toggle_fullscreen()
+            return True
+
+        return False
@@ -0,0 +1,70 @@
+# the per-frame paths must not allocate buffers proportional to the frame -
+# they write into arrays that are reused from frame to frame
+
+from array import array
+import tracemalloc
+
+from spectrum_layout import group_ranges
+from spectrum_layout import scale_bands
+from spectrum_smooth import FrameSmoother
+
+BANDS = 4096
+# far less than one frame of BANDS doubles - only transient floats and
+# loop state may be allocated
+LIMIT = 1024
+
+
+def peak_allocated(function, iterations=50):
+    '''
+    returns the most memory (bytes) allocated at once whilst calling
+    function repeatedly, after a first call to warm up
+    '''
+    function()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for i in range(iterations):
+            function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return peak - base
+
+
+def frame(offset=0.0):
+    return array('d', [-60.0 + (i % 60) + offset for i in range(BANDS)])
+
+
+def test_scale_bands_grouped():
+    magnitudes = frame()
+    # a few wide groups - a slice per group would be kilobytes
+    ranges = group_ranges(BANDS, 4)
+    spect = array('d', [0.0] * len(ranges))
+
+    assert peak_allocated(lambda: scale_bands(magnitudes, ranges, 1.5, spect)) < LIMIT
+    assert spect[0] == (-60.0 + 59) * 1.5
+
+
+def test_scale_bands_ungrouped():
+    magnitudes = frame()
+    spect = array('d', [0.0] * BANDS)
+
+    assert group_ranges(BANDS, BANDS) is None
+    assert peak_allocated(lambda: scale_bands(magnitudes, None, 2.0, spect)) < LIMIT
+    assert spect[1] == -59.0 * 2.0
+
+
+def test_smoother():
+    smoother = FrameSmoother()
+    frames = [frame(), frame(-10.0)]
+    clock = [0.0]
+
+    def step():
+        clock[0] += 0.1
+        smoother.push(frames[int(clock[0] * 10) % 2], clock[0])
+        for i in range(6):
+            smoother.advance(clock[0] + i / 60.0)
+        smoother.settled(clock[0] + 0.1)
+
+    assert peak_allocated(step) < LIMIT
@@ -0,0 +1,91 @@
+# bar geometry across view sizes and device scales - the bars drawn must
+# always fit within the view, with edges on whole device pixels
+
+import pytest
+
+from spectrum_layout import BAR_START
+from spectrum_layout import BandLayout
+from spectrum_layout import DISPLAY_BANDS
+from spectrum_layout import FIRST_BAND
+from spectrum_layout import natural_width
+
+WIDTHS = (0, 10, 200, 400, 1920, 20000)
+HEIGHT = 100
+MIN_BAND_WIDTH = 4
+BAND_INTERVAL = 3
+# narrowest view that shows every band at the minimum bar width
+NATURAL_WIDTH = natural_width(DISPLAY_BANDS, MIN_BAND_WIDTH, BAND_INTERVAL)
+
+
+def layout(width, scale, max_bands=DISPLAY_BANDS):
+    return BandLayout(width, HEIGHT, max_bands, MIN_BAND_WIDTH,
+                      BAND_INTERVAL, scale)
+
+
+@pytest.mark.parametrize('scale', (1, 2))
+@pytest.mark.parametrize('width', WIDTHS)
+def test_bars_fit(width, scale):
+    bands = layout(width, scale)
+
+    assert 0 <= bands.bands <= DISPLAY_BANDS
+    assert len(bands.x) == bands.bands
+    assert (bands.band_width * scale).is_integer()
+    if bands.bands > FIRST_BAND:
+        assert bands.x[FIRST_BAND] == BAR_START
+        # the right edge of the last bar is inside the view - the bars are
+        # not meant to extend past it at any width
+        assert bands.x[-1] + bands.band_width <= width
+    if width >= NATURAL_WIDTH:
+        assert bands.bands == DISPLAY_BANDS
+        # wider views widen the bars rather than leaving space - one more
+        # device pixel per bar would not fit
+        drawn = bands.bands - FIRST_BAND
+        assert bands.x[-1] + bands.band_width + drawn / float(scale) > width
+    else:
+        assert bands.band_width == MIN_BAND_WIDTH
+
+
+def test_band_counts():
+    assert [layout(width, 1).bands for width in WIDTHS] == [0, 3, 30, 58, 64, 64]
+    assert NATURAL_WIDTH == 436
+    assert layout(NATURAL_WIDTH, 1).band_width == MIN_BAND_WIDTH
+    assert layout(NATURAL_WIDTH - 1, 1).bands == DISPLAY_BANDS - 1
+    assert natural_width(FIRST_BAND) == BAR_START
+    for bands in (10, 32, 512):
+        assert layout(natural_width(bands), 1, bands).bands == bands
+        assert layout(natural_width(bands) - 1, 1, bands).bands == bands - 1
+
+
+def overlapping(bands, left, right):
+    return [i for i in range(FIRST_BAND, bands.bands)
+            if bands.x[i] < right and bands.x[i] + bands.band_width > left]
+
+
+@pytest.mark.parametrize('scale', (1, 2))
+def test_visible(scale):
+    bands = layout(1920, scale)
+
+    assert bands.visible(0, 1920) == (FIRST_BAND, DISPLAY_BANDS)
+    assert bands.visible(0, 1920, 10) == (FIRST_BAND, 10)
+    # scrolled windows of a view wider than the viewport: every bar at
+    # least partly inside is drawn, and at most one more on either side
+    for left in range(0, 1920, 37):
+        right = left + 300
+        first, end = bands.visible(left, right)
+        wanted = overlapping(bands, left, right)
+        if wanted:
+            assert first <= wanted[0] <= first + 1
+            assert wanted[-1] <= end - 1 <= wanted[-1] + 1
+        else:
+            assert end - first <= 1
+    # past the last bar at most the last one is drawn
+    first, end = bands.visible(1920, 2220)
+    assert end - first <= 1
+
+
+def test_visible_empty():
+    bands = layout(0, 1)
+    first, end = bands.visible(0, 100)
+
+    assert bands.bands == 0
+    assert first >= end
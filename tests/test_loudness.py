@@ -0,0 +1,75 @@
+import cmath
+import math
+
+from spectrum_loudness import LoudnessMeter
+from spectrum_loudness import SILENCE
+
+RATE = 44100
+BANDS = 64
+THRESHOLD = -60
+
+
+def element_frame(samples, bands=BANDS, threshold=THRESHOLD):
+    '''
+    band magnitudes (dB) as the GStreamer spectrum element reports them for
+    mono samples - Hamming windowed FFTs of 2 * (bands - 1) points, one half
+    kept, power divided by N^2 and averaged over the frame
+    '''
+    nfft = 2 * (bands - 1)
+    window = [0.53836 - 0.46164 * math.cos(2.0 * math.pi * n / nfft)
+              for n in range(nfft)]
+    powers = [0.0] * bands
+    blocks = len(samples) // nfft
+    for block in range(blocks):
+        chunk = [samples[block * nfft + n] * window[n] for n in range(nfft)]
+        for k in range(bands):
+            value = sum(chunk[n] * cmath.exp(-2j * math.pi * k * n / nfft)
+                        for n in range(nfft))
+            powers[k] += abs(value) ** 2 / (nfft * nfft)
+
+    return [max(10.0 * math.log10(power / blocks), threshold) if power else threshold
+            for power in powers]
+
+
+def sine(freq, seconds, amplitude=1.0):
+    return [amplitude * math.sin(2.0 * math.pi * freq * n / RATE)
+            for n in range(int(seconds * RATE))]
+
+
+def measure(frame, channels, frames=10):
+    meter = LoudnessMeter(0.1, THRESHOLD)
+    meter.set_format(RATE, len(frame), channels)
+    for i in range(frames):
+        meter.add_spectrum(frame)
+
+    return meter
+
+
+def test_full_scale_sine_one_channel():
+    # BS.1770: a 0 dBFS 997 Hz sine in one channel reads -3.01 LUFS
+    meter = measure(element_frame(sine(997, 0.1)), 1)
+
+    assert abs(meter.momentary - -3.01) < 0.5
+    assert abs(meter.short_term - -3.01) < 0.5
+
+
+def test_full_scale_sine_stereo():
+    # the element mixes identical channels down to the same sine; their
+    # powers are summed, giving 0 LUFS
+    meter = measure(element_frame(sine(997, 0.1)), 2)
+
+    assert abs(meter.momentary) < 0.5
+
+
+def test_level_follows_amplitude():
+    loud = measure(element_frame(sine(997, 0.1)), 1)
+    quiet = measure(element_frame(sine(997, 0.1, 0.1)), 1)
+
+    assert abs(loud.momentary - quiet.momentary - 20.0) < 0.5
+
+
+def test_silence():
+    meter = measure([float(THRESHOLD)] * BANDS, 2)
+
+    assert meter.momentary == SILENCE
+    assert meter.short_term == SILENCE
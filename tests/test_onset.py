@@ -0,0 +1,64 @@
+# onset detection on a synthetic click track - a broadband click every half
+# second (120 bpm) over silence, in frames 0.1 s apart as the balanced
+# preset delivers them
+
+from array import array
+import time
+
+import pytest
+
+from spectrum_onset import OnsetDetector
+
+BANDS = 64
+INTERVAL = 0.1
+THRESHOLD = -60
+# frames between clicks at 120 bpm, and the clicks in 30 seconds
+CLICK_FRAMES = 5
+CLICKS = 60
+
+
+def click_track(clicks=CLICKS, bands=BANDS):
+    '''
+    frames of band magnitudes (dB): silence with a click every
+    CLICK_FRAMES frames, the first after two frames of silence
+    '''
+    silence = array('d', [float(THRESHOLD)] * bands)
+    click = array('d', [-10.0] * bands)
+    return [click if number % CLICK_FRAMES == 2 else silence
+            for number in range(clicks * CLICK_FRAMES)]
+
+
+def test_click_track():
+    detector = OnsetDetector(INTERVAL)
+    strengths = [detector.add(frame) for frame in click_track()]
+
+    assert detector.onsets == CLICKS
+    # every click, and nothing else, is reported
+    assert [number for number, strength in enumerate(strengths) if strength] == \
+        list(range(2, CLICKS * CLICK_FRAMES, CLICK_FRAMES))
+    assert detector.tempo == pytest.approx(120.0)
+
+
+def test_click_track_stream_time():
+    detector = OnsetDetector(INTERVAL)
+    for number, frame in enumerate(click_track()):
+        detector.add(frame, number * INTERVAL)
+
+    assert detector.onsets == CLICKS
+    assert detector.tempo == pytest.approx(120.0)
+
+
+def test_throughput():
+    frames = click_track()
+    detector = OnsetDetector(INTERVAL)
+    repeats = 20
+
+    start = time.process_time()
+    for i in range(repeats):
+        for frame in frames:
+            detector.add(frame)
+    elapsed = time.process_time() - start
+
+    # the low latency preset needs 30 frames a second; detection runs on
+    # the main loop beside drawing, so it should take a small part of it
+    assert len(frames) * repeats / elapsed > 3000
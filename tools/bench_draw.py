@@ -0,0 +1,108 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# times a view's per frame work - scaling a frame to the bars and drawing
+# them with BarRenderer - on an image surface at device scale 1 and 2, as
+# a HiDPI display draws it. Needs only pycairo. Run from the repository:
+#
+#   python3 tools/bench_draw.py
+
+from array import array
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cairo
+
+from spectrum_bars import BarRenderer
+from spectrum_layout import BandLayout
+from spectrum_layout import DISPLAY_BANDS
+from spectrum_layout import FIRST_BAND
+from spectrum_layout import group_ranges
+from spectrum_layout import raise_peaks
+from spectrum_layout import scale_bands
+from spectrum_palette import PALETTES
+
+FRAMES = 500
+# distinct frames cycled through
+POOL = 16
+WIDTH = 1280
+HEIGHT = 360
+THRESHOLD = -60
+
+
+def spectrum_frames(bands):
+    return [array('d', [float(THRESHOLD + (i * 7 + number) % 55)
+                        for i in range(bands)])
+            for number in range(POOL)]
+
+
+def run(bands, scale, palette):
+    '''
+    returns the seconds per frame spent scaling and drawing
+    '''
+    layout = BandLayout(WIDTH, HEIGHT, DISPLAY_BANDS, scale=scale)
+    ranges = group_ranges(bands, layout.bands)
+    height_scale = HEIGHT / float(DISPLAY_BANDS)
+    frames = spectrum_frames(bands)
+
+    # the widget's window at device resolution
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH * scale, HEIGHT * scale)
+    surface.set_device_scale(scale, scale)
+    cr = cairo.Context(surface)
+    bars = BarRenderer(cr, layout, palette, HEIGHT, scale=scale)
+
+    spect = array('d', [0.0] * (len(ranges) if ranges else bands))
+    peaks = array('d', [THRESHOLD * height_scale] * len(spect))
+    end = min(layout.bands, len(spect))
+
+    scale_time = draw_time = 0.0
+    for number in range(FRAMES):
+        start = time.perf_counter()
+        data = scale_bands(frames[number % POOL], ranges, height_scale, spect)
+        raise_peaks(peaks, data, layout.bands)
+        scaled = time.perf_counter()
+
+        cr.set_source_rgb(0, 0, 0)
+        cr.paint()
+        bars.draw(cr, data, peaks, FIRST_BAND, end, palette.alpha)
+        surface.flush()
+        drawn = time.perf_counter()
+
+        scale_time += scaled - start
+        draw_time += drawn - scaled
+
+    return scale_time / FRAMES, draw_time / FRAMES
+
+
+def main():
+    print('%dx%d logical pixels, %d frames' % (WIDTH, HEIGHT, FRAMES))
+    print('bands scale palette   scale us/frame   draw ms/frame      fps')
+    for bands in (64, 512):
+        for scale in (1, 2):
+            for name in ('classic', 'rainbow'):
+                scale_time, draw_time = run(bands, scale, PALETTES[name])
+                print('%5d %5d %-8s %15.1f %15.2f %8.0f' % (
+                    bands, scale, name, scale_time * 1e6, draw_time * 1e3,
+                    1.0 / (scale_time + draw_time)))
+
+
+if __name__ == '__main__':
+    main()
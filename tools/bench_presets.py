@@ -0,0 +1,114 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# measures the CPU cost of each analysis preset: a minute of stereo pink
+# noise is pushed as fast as possible through
+#
+#   audiotestsrc ! capsfilter ! AnalysisBin ! fakesink
+#
+# and the process CPU time is compared with the same pipeline without the
+# AnalysisBin. The balanced preset is then run with and without the mono
+# 22.05 kHz downmix at source rates of 44.1, 48 and 96 kHz. Run from the
+# repository:
+#
+#   python3 tools/bench_presets.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from spectrum_analysis import AnalysisBin
+from spectrum_analysis import PRESETS
+
+# seconds of audio analysed per run
+DURATION = 60
+# buffers per second of audio
+BUFFERS = 100
+
+
+def run(preset=None, rate=44100, downmix=False):
+    '''
+    returns the process CPU seconds taken to play DURATION seconds of
+    stereo audio at `rate` through an AnalysisBin of `preset`, or with no
+    analysis if preset is None
+    '''
+    pipeline = Gst.Pipeline()
+    source = Gst.ElementFactory.make("audiotestsrc")
+    source.set_property("wave", "pink-noise")
+    source.set_property("samplesperbuffer", rate // BUFFERS)
+    source.set_property("num-buffers", DURATION * BUFFERS)
+    capsfilter = Gst.ElementFactory.make("capsfilter")
+    capsfilter.set_property("caps", Gst.Caps.from_string(
+        "audio/x-raw,format=F32LE,channels=2,rate=%d" % rate))
+    sink = Gst.ElementFactory.make("fakesink")
+    sink.set_property("sync", False)
+
+    elements = [source, capsfilter]
+    if preset:
+        elements.append(AnalysisBin(preset, downmix=downmix))
+    elements.append(sink)
+
+    for element in elements:
+        pipeline.add(element)
+    for upstream, downstream in zip(elements, elements[1:]):
+        upstream.link(downstream)
+
+    start = time.process_time()
+    pipeline.set_state(Gst.State.PLAYING)
+    # the spectrum messages are popped and dropped along the way
+    message = pipeline.get_bus().timed_pop_filtered(
+        Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    elapsed = time.process_time() - start
+    pipeline.set_state(Gst.State.NULL)
+
+    if message.type == Gst.MessageType.ERROR:
+        raise RuntimeError(message.parse_error()[0].message)
+
+    return elapsed
+
+
+def main():
+    Gst.init([])
+
+    base = run()
+    print('%d s of 44.1 kHz stereo audio, %.2f s CPU without analysis' % (DURATION, base))
+    print('preset             bands  interval   CPU s   analysis %')
+    for preset in ('balanced', 'low-latency', 'high-resolution', 'low-cpu'):
+        elapsed = run(preset)
+        print('%-16s %7d %9.3f %7.2f %11.2f' % (
+            preset, PRESETS[preset]['bands'], PRESETS[preset]['interval'],
+            elapsed, 100.0 * (elapsed - base) / DURATION))
+
+    print()
+    print('balanced preset     full CPU s   downmix CPU s   saving %')
+    for rate in (44100, 48000, 96000):
+        base = run(rate=rate)
+        full = run('balanced', rate) - base
+        downmix = run('balanced', rate, downmix=True) - base
+        print('%5.1f kHz stereo %13.2f %15.2f %10.1f' % (
+            rate / 1000.0, full, downmix, 100.0 * (full - downmix) / full))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+#
+# Copyright (C) 2014 - fossfreedom
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301  USA.
+
+# times the delivery of spectrum messages to the views - the per message
+# 'spectrum-data-found' GObject signal the plugin used to emit, with one
+# scaled list and one idle callback per view, against the analyser's
+# preallocated frame store and single idle delivery.
+#
+# Messages are handed to the bus handlers directly, `burst` of them per
+# main loop iteration (more than one when the main loop is busy), so only
+# the plugin's side of the delivery is timed. Run from the repository:
+#
+#   python3 tools/bench_publish.py
+
+from array import array
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib
+from gi.repository import GObject
+from gi.repository import Gst
+
+from spectrum_analysis import SpectrumAnalyser
+from spectrum_layout import scale_bands
+
+MESSAGES = 20000
+# distinct messages cycled through
+POOL = 16
+HEIGHT_SCALE = 1.5
+
+
+class SignalAnalyser(GObject.Object):
+    '''
+    the analyser before the frame store: every message is decoded into a
+    new list and emitted as a PYOBJECT signal
+    '''
+    __gsignals__ = {
+        'spectrum-data-found': (GObject.SignalFlags.RUN_LAST, None, (object,)),
+    }
+
+    def message_handler(self, bus, message):
+        if message.type == Gst.MessageType.ELEMENT:
+            s = message.get_structure()
+
+            if s.get_name() == "spectrum":
+                waittime = 0
+                if s.has_field("stream-time") and s.has_field("duration"):
+                    waittime = s.get_value("stream-time") + s.get_value("duration")
+
+                if waittime:
+                    fullstr = s.to_string()
+                    magstr = fullstr[fullstr.find('{') + 1: fullstr.rfind('}') - 1]
+                    magnitude_list = [float(x) for x in magstr.split(',')]
+                    self.emit("spectrum-data-found", magnitude_list)
+
+        return True
+
+
+class SignalView(object):
+    '''
+    a view before the frame store - scales each message into a new list
+    and schedules its own idle update
+    '''
+
+    def __init__(self, analyser):
+        self.updates = 0
+        analyser.connect('spectrum-data-found', self.on_event_load_spect)
+
+    def on_event_load_spect(self, obj, magnitude_list):
+        spect = [i * HEIGHT_SCALE for i in magnitude_list]
+        GLib.idle_add(self.delayed_idle_spectrum_update, spect)
+
+    def delayed_idle_spectrum_update(self, spect):
+        self.updates += 1
+        return False
+
+
+class StoreView(object):
+    '''
+    a view of the frame store - scales the latest frame into its own
+    preallocated array once per delivery
+    '''
+
+    def __init__(self, analyser, bands):
+        self.updates = 0
+        self.spect = array('d', [0.0] * bands)
+        analyser.subscribe(self.on_event_load_spect)
+
+    def on_event_load_spect(self, magnitude_list):
+        scale_bands(magnitude_list, None, HEIGHT_SCALE, self.spect)
+        self.updates += 1
+
+
+def spectrum_messages(bands):
+    messages = []
+    for number in range(POOL):
+        values = ', '.join('%d' % (-60 + (i * 7 + number) % 50)
+                           for i in range(bands))
+        structure = Gst.Structure.new_from_string(
+            'spectrum, stream-time=(guint64)%d, duration=(guint64)100000000, '
+            'magnitude=(float){ %s }' % ((number + 1) * 100000000, values))
+        messages.append(Gst.Message.new_element(None, structure))
+
+    return messages
+
+
+def drain(context):
+    while context.iteration(False):
+        pass
+
+
+def run(handler, messages, burst):
+    '''
+    returns the process CPU seconds taken to deliver MESSAGES messages
+    '''
+    context = GLib.MainContext.default()
+    drain(context)
+
+    start = time.process_time()
+    for number in range(MESSAGES):
+        handler(None, messages[number % POOL])
+        if number % burst == burst - 1:
+            drain(context)
+    drain(context)
+
+    return time.process_time() - start
+
+
+def main():
+    Gst.init([])
+
+    print('bands views burst   signal us/msg   store us/msg   updates (signal/store)')
+    for bands in (64, 512):
+        messages = spectrum_messages(bands)
+        for views in (1, 3):
+            for burst in (1, 4):
+                before = SignalAnalyser()
+                before_views = [SignalView(before) for i in range(views)]
+                before_time = run(before.message_handler, messages, burst)
+
+                after = SpectrumAnalyser(None)
+                after_views = [StoreView(after, bands) for i in range(views)]
+                after_time = run(after.message_handler, messages, burst)
+
+                print('%5d %5d %5d %15.1f %14.1f   %d/%d' % (
+                    bands, views, burst,
+                    before_time * 1e6 / MESSAGES, after_time * 1e6 / MESSAGES,
+                    sum(view.updates for view in before_views),
+                    sum(view.updates for view in after_views)))
+
+
+if __name__ == '__main__':
+    main()